@@ -1,42 +1,140 @@
 # server/main.py
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 import numpy as np
-from scipy.io.wavfile import write
 import os
 import sys
-import requests  # <-- make sure to import this
-import httpx
-from demucs import pretrained
-from demucs.apply import apply_model
+import threading
 from datetime import datetime
-import torch
-import torchaudio
-from typing import List
-import io
+from typing import Dict, List, Literal, Optional
 import json
+import re
+import asyncio
+import itertools
+import queue
+import time
+import tempfile
+
+from sessions import SessionStore
+from dsp import (
+    rfft_freqs, slider_bands, stream_equalize, IncrementalEq, real_dtype, FFT_SIZINGS,
+    source_spectra, mix_spectrum, analysis_window, stft_batches, stft_frame_count,
+)
+import wire
+from lod import MaxPyramid, decimate
+from dsp_pool import DspPool, estimate_peak, measure
+from model_registry import ModelRegistry, ModelBusy
+from stem_cache import StemCache
+from audio_io import read_audio, spool_upload, write_wav
+from metrics import MetricsMiddleware, profiled, profiles, record_dsp, render as render_metrics, span
+from separation import demucs_segments, separate_demucs
+from model_variants import VARIANTS, make_variant, variant_name
+from jobs import JobQueue, QueueFull
+from pathlib import Path
+from contextlib import contextmanager, suppress
 
 app = FastAPI()
 
+# Uploaded signals live here between slider moves (size-bounded LRU)
+sessions = SessionStore(
+    max_bytes=int(os.environ.get("HARMONIX_SESSION_CACHE_MB", "512")) * 1024 * 1024,
+    max_sessions=int(os.environ.get("HARMONIX_SESSION_MAX_COUNT", "64")),
+)
+
+DSP_PRECISION = os.environ.get("HARMONIX_DSP_PRECISION", "float64")
+
+# Padded FFT length: "fast" (5-smooth, next_fast_len), "exact" (no padding)
+# or "pow2" (next power of two, matching the C++ server)
+FFT_SIZING = os.environ.get("HARMONIX_FFT_SIZING", "fast")
+if FFT_SIZING not in FFT_SIZINGS:
+    raise ValueError(f"HARMONIX_FFT_SIZING must be one of {FFT_SIZINGS}")
+
+# Uploads are spooled to HARMONIX_UPLOAD_DIR (default: the system temp dir)
+# and decoded block by block; decoded audio larger than
+# HARMONIX_UPLOAD_MMAP_MB lives in a memory-mapped temp file instead of RAM
+UPLOAD_DIR = os.environ.get("HARMONIX_UPLOAD_DIR") or None
+UPLOAD_MMAP_BYTES = int(os.environ.get("HARMONIX_UPLOAD_MMAP_MB", "256")) * 1024 * 1024
+
+# Incremental EQ recomputes exactly after this many band-by-band updates
+EQ_FULL_EVERY = int(os.environ.get("HARMONIX_EQ_FULL_EVERY", "32"))
+
+# FFT / EQ / STFT kernels run inline ("thread") or in worker processes
+# ("process", sample buffers passed through shared memory; see dsp_pool.py)
+dsp_pool = DspPool(
+    backend=os.environ.get("HARMONIX_DSP_BACKEND", "thread"),
+    workers=int(os.environ.get("HARMONIX_DSP_WORKERS", "0")) or None,
+)
+
+
+@app.on_event("startup")
+def start_dsp_pool():
+    dsp_pool.warm_up()
+
+
+@app.on_event("shutdown")
+def stop_dsp_pool():
+    dsp_pool.shutdown()
+
 # Allow CORS so client can fetch
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or your frontend URL
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers the browser client may read
+    expose_headers=[
+        "Server-Timing", "X-Profile-Id", "X-Sample-Rate", "X-Channels", "X-Length",
+        "X-EQ-Mode", "X-DSP-Queue-Ms", "X-DSP-Compute-Ms", "X-DSP-Peak-Bytes",
+    ],
 )
 
-# Request model
-class EQRequestSave(BaseModel):
-    samples: list[float]
-    sampleRate: int
-    mode: str
+# Latency / bytes / stage histograms for every request (see metrics.py)
+app.add_middleware(MetricsMiddleware, router_app=app)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Result of a request sent with ?profile=cprofile|torch (HARMONIX_PROFILING=1)."""
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or unfinished profile: {profile_id}")
+    media_type, content = profile
+    return Response(content, media_type=media_type)
 
 # ---------- Request Models ----------
-class FFTRequest(BaseModel):
+# `precision` (float64 / float32) picks the working precision of the FFT, EQ
+# and STFT; the default is HARMONIX_DSP_PRECISION. Sessions keep the
+# precision they were created with.
+class SessionRequest(BaseModel):
     samples: List[float]
     fs: float
+    precision: Optional[Literal["float64", "float32"]] = None
+
+
+# Optional level-of-detail for returned spectra: about `points` buckets over
+# [fmin, fmax], evenly spaced on a linear or log axis. Omit for every bin.
+class SpectrumView(BaseModel):
+    points: Optional[int] = Field(None, gt=0)
+    fmin: Optional[float] = None
+    fmax: Optional[float] = None
+    logFreq: bool = False
+    decimate: Literal["peak", "minmax"] = "peak"
+
+
+# Either send `samples` + `fs`, or a `sessionId` returned by /session
+class FFTRequest(SpectrumView):
+    samples: Optional[List[float]] = None
+    fs: Optional[float] = None
+    sessionId: Optional[str] = None
+    precision: Optional[Literal["float64", "float32"]] = None
 
 
 class EQSlider(BaseModel):
@@ -45,15 +143,60 @@ class EQSlider(BaseModel):
     value: float
 
 
-class EQRequest(BaseModel):
-    samples: List[float]
-    fs: float
+class EQRequest(SpectrumView):
+    samples: Optional[List[float]] = None
+    fs: Optional[float] = None
+    sessionId: Optional[str] = None
     sliders: List[EQSlider]
+    precision: Optional[Literal["float64", "float32"]] = None
+    # Only used by /applyEqualizer/stream
+    blockSize: int = 4096
+    # With a sessionId: update the previous result band by band when only
+    # slider values changed (see dsp.IncrementalEq)
+    incremental: bool = False
+
+
+# Either the processed samples + sampleRate, or a sessionId + sliders to
+# equalize and write server-side (the audio never round-trips the browser)
+class EQRequestSave(BaseModel):
+    samples: Optional[List[float]] = None
+    sampleRate: Optional[int] = None
+    sessionId: Optional[str] = None
+    sliders: Optional[List[EQSlider]] = None
+    mode: str
+
+
+# Remix of stems cached by /MusicAi (its `stemsId`). gains maps the model's
+# source names (its `sources`) to gains; sources left out are muted.
+class StemRemixRequest(BaseModel):
+    stemsId: str
+    gains: Dict[str, float]
+    normalize: bool = True
+    spectrum: bool = False  # also return the mix's frequencies / magnitudes
+    points: Optional[int] = Field(None, gt=0)
 
 
 class SpectrogramRequest(BaseModel):
-    samples: List[float]
-    fs: float
+    samples: Optional[List[float]] = None
+    fs: Optional[float] = None
+    sessionId: Optional[str] = None
+    windowSize: int = 2048
+    hopSize: Optional[int] = None          # defaults to windowSize // 4
+    window: str = "hann"                   # any scipy.signal window name
+    scale: Literal["linear", "db"] = "linear"
+    dtype: Literal["float64", "float32"] = "float64"
+    padEnd: bool = True                    # keep the trailing partial frame
+    # Optional level-of-detail: viewport and target resolution for z
+    maxFrames: Optional[int] = Field(None, gt=0)
+    maxFreqBins: Optional[int] = Field(None, gt=0)
+    tmin: Optional[float] = None
+    tmax: Optional[float] = None
+    fmin: Optional[float] = None
+    fmax: Optional[float] = None
+    logFreq: bool = False
+    precision: Optional[Literal["float64", "float32"]] = None
+    # Only used by /spectrogram/stream and /spectrogram/ws: frames per message
+    batchFrames: int = 256
 
 class GainItem(BaseModel):
     name: str
@@ -65,343 +208,1307 @@ class AudioRequest(BaseModel):
     sliders: List[GainItem]
 
 
+# ---------- Wire format ----------
+def payload(model_cls):
+    """Body dependency accepting JSON or the binary formats from wire.py.
+
+    Binary bodies carry the arrays; scalar fields come from the framed header
+    meta or, for raw octet-stream, from the query string (sliders as JSON).
+    """
+    async def parse(request: Request):
+        with span("receive"):
+            body = await request.body()
+        content_type = request.headers.get("content-type")
+        try:
+            with span("parse"):
+                if not wire.is_binary(content_type):
+                    return model_cls.model_validate_json(body)
+
+                meta, arrays = wire.decode(body, content_type)
+                fields = {}
+                for key, value in request.query_params.items():
+                    fields[key] = json.loads(value) if value.startswith(("[", "{")) else value
+                fields.update(meta)
+                return with_arrays(model_cls, fields, arrays)
+        except (ValidationError, wire.WireFormatError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    return parse
+
+
+def with_arrays(model_cls, fields, arrays):
+    """Validate the scalar fields, then attach arrays without copying."""
+    req = model_cls.model_validate({**fields, **{name: [] for name in arrays}})
+    for name, arr in arrays.items():
+        if name in model_cls.model_fields:
+            setattr(req, name, arr)
+    return req
+
+
+def respond(request, content):
+    """Encode a response dict, using the binary format when the client asks for it."""
+    arrays = {k: v for k, v in content.items() if isinstance(v, np.ndarray)}
+    kind = wire.negotiate(request.headers.get("accept"), len(arrays))
+    with span("serialize"):
+        if kind is not None:
+            meta = {k: v for k, v in content.items() if k not in arrays}
+            return Response(wire.encode(arrays, meta, kind=kind), media_type=kind)
+        return JSONResponse({
+            k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in content.items()
+        })
+
+
+def with_timing(response, timing):
+    """Report DSP backend queue wait and compute time (ms) as response headers."""
+    if timing is not None:
+        record_dsp(timing)
+        response.headers["X-DSP-Queue-Ms"] = f"{timing['queue'] * 1000:.2f}"
+        response.headers["X-DSP-Compute-Ms"] = f"{timing['compute'] * 1000:.2f}"
+        if timing.get("peakBytes") is not None:
+            response.headers["X-DSP-Peak-Bytes"] = str(timing["peakBytes"])
+    return response
+
+
+def precision_of(req):
+    return req.precision or DSP_PRECISION
+
+
+def request_samples(req):
+    """Inline samples as an array in the request's working precision."""
+    with span("to_numpy"):
+        return np.asarray(req.samples, dtype=real_dtype(precision_of(req)))
+
+
 # ---------- Utils ----------
-def next_power_of_2(n):
-    return 1 << (n - 1).bit_length()
+def get_session(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+    return session
 
 
-# ===============================================================
-#   1️⃣ /calculatefft
-# ===============================================================
-@app.post("/calculatefft")
-def calculate_fft(req: FFTRequest):
+def spectrum_view(req, freqs, mags, pyramid=None):
+    """Apply the request's SpectrumView (if any) to a spectrum."""
+    if req.points is None and req.fmin is None and req.fmax is None and not req.logFreq:
+        return freqs, mags
+    x_range = (req.fmin, req.fmax)
+    with span("view"):
+        if pyramid is not None and req.decimate == "peak":
+            return pyramid.view(req.points, x_range, req.logFreq)
+        return decimate(freqs, mags, req.points, x_range, req.logFreq, req.decimate)
 
-    samples = np.array(req.samples, dtype=float)
-    fs = req.fs
 
-    n_original = len(samples)
-    n = next_power_of_2(n_original)
+def resolve_session(req):
+    """Return the cached AudioSession for req, or None for inline samples."""
+    if req.sessionId:
+        return get_session(req.sessionId)
+    if req.samples is None or req.fs is None:
+        raise HTTPException(status_code=422, detail="Provide either sessionId or samples + fs")
+    return None
 
-    # Zero-pad
-    data = np.zeros(n, dtype=complex)
-    data[:n_original] = samples
 
-    # FFT
-    fft_data = np.fft.fft(data)
+# ===============================================================
+#   0️⃣ /session  (upload once, then refer to the signal by id)
+# ===============================================================
+@app.post("/session")
+def create_session(req: SessionRequest = Depends(payload(SessionRequest))):
+    if len(req.samples) == 0:
+        raise HTTPException(status_code=422, detail="samples must not be empty")
+    session_id, session = sessions.create(req.samples, req.fs, precision_of(req), FFT_SIZING)
+    return {
+        "sessionId": session_id,
+        "length": session.n_original,
+        "fftSize": session.n,
+        "fs": session.fs,
+        "precision": session.precision,
+        "bytes": session.nbytes,
+    }
 
-    # Frequencies & magnitudes
-    freqs = np.fft.fftfreq(n, d=1/fs)[: n//2 + 1]
-    mags = np.abs(fft_data[: n//2 + 1])
 
+# Same, from an audio file: spooled and decoded block by block (mixed to
+# mono) instead of arriving as a JSON float array
+@app.post("/session/upload")
+async def upload_session(
+    file: UploadFile = File(...),
+    precision: Optional[Literal["float64", "float32"]] = Form(None),
+):
+    upload = await spool_upload(file, UPLOAD_DIR)
+    try:
+        audio, fs = await asyncio.to_thread(read_upload, upload)
+    finally:
+        upload.discard()
+    if audio.shape[-1] == 0:
+        raise HTTPException(status_code=422, detail="uploaded file has no samples")
+
+    def create():
+        samples = audio[0] if audio.shape[0] == 1 else audio.mean(axis=0)
+        return sessions.create(samples, fs, precision or DSP_PRECISION, FFT_SIZING)
+
+    # The mono mix and the padded forward FFT are seconds of work on long files
+    session_id, session = await asyncio.to_thread(create)
     return {
-        "frequencies": freqs.tolist(),
-        "magnitudes": mags.tolist()
+        "sessionId": session_id,
+        "length": session.n_original,
+        "fftSize": session.n,
+        "fs": session.fs,
+        "precision": session.precision,
+        "bytes": session.nbytes,
     }
 
 
-# Backwards/alternate route names (aliases)
-@app.post("/CalcFFT")
-def calcfft_alias(req: FFTRequest):
-    return calculate_fft(req)
+@app.delete("/session/{session_id}")
+def delete_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+    return {"deleted": session_id}
+
+
+@app.get("/session")
+def session_stats():
+    return sessions.stats()
 
 
 # ===============================================================
-#   2️⃣ /applyEqualizer
+#   1️⃣ /calculatefft
 # ===============================================================
-@app.post("/applyEqualizer")
-def apply_equalizer(req: EQRequest):
-    samples = np.array(req.samples, dtype=float)
-    fs = req.fs
+@app.post("/calculatefft")
+@profiled
+def calculate_fft(request: Request, req: FFTRequest = Depends(payload(FFTRequest))):
+    session = resolve_session(req)
+    if session is not None:
+        # Spectrum was computed once when the session was created; its
+        # magnitude pyramid makes repeated zoom / pan requests cheap
+        pyramid = sessions.derived(
+            req.sessionId, session, "fft_pyramid",
+            lambda: MaxPyramid(session.freqs, np.abs(session.spectrum)),
+        )
+        freqs, mags = pyramid.levels[0]
+        timing = None
+    else:
+        samples = request_samples(req)
+        fs = req.fs
+        pyramid = None
 
-    n_original = len(samples)
-    n = next_power_of_2(n_original)
+        # Zero-padded real FFT (positive frequencies only)
+        out, meta, timing = dsp_pool.run("fft", {"samples": samples}, sizing=FFT_SIZING)
 
-    # Zero-pad
-    data = np.zeros(n)
-    data[:n_original] = samples
+        # Frequencies & magnitudes
+        freqs = rfft_freqs(meta["n"], fs)
+        mags = out["magnitudes"]
 
-    # FFT
-    fft_data = np.fft.fft(data)
+    freqs, mags = spectrum_view(req, freqs, mags, pyramid)
 
-    # Frequency array
-    freqs = np.fft.fftfreq(n, 1/fs)
+    return with_timing(respond(request, {
+        "frequencies": freqs,
+        "magnitudes": mags
+    }), timing)
 
-    # Apply gain to selected bands
-    for band in req.sliders:
-        # Positive frequency mask
-        mask = (freqs >= band.low) & (freqs <= band.high)
-        fft_data[mask] *= band.value
 
-        # Negative frequency mask (mirrored)
-        neg_mask = (freqs <= -band.low) & (freqs >= -band.high)
-        fft_data[neg_mask] *= band.value
+# Backwards/alternate route names (aliases)
+@app.post("/CalcFFT")
+def calcfft_alias(request: Request, req: FFTRequest = Depends(payload(FFTRequest))):
+    return calculate_fft(request, req)
+
 
-    # BEFORE inverse FFT → for visualization
-    vis_freqs = freqs[: n//2 + 1]
-    vis_mags = np.abs(fft_data[: n//2 + 1])
+# ===============================================================
+#   2️⃣ /applyEqualizer
+# ===============================================================
+@app.post("/applyEqualizer")
+@profiled
+def apply_equalizer(request: Request, req: EQRequest = Depends(payload(EQRequest))):
+    session = resolve_session(req)
+    bands = slider_bands(req.sliders)
+    mode = "full"
+    if session is not None and req.incremental:
+        first = None
+
+        def prime():
+            # Apply before caching so the session's byte count includes the state
+            nonlocal first
+            state = IncrementalEq(
+                session.spectrum, session.n, session.n_original, session.fs,
+                full_every=EQ_FULL_EVERY,
+            )
+            first = state.apply(bands)
+            return state
+
+        fs = session.fs
+        start = time.perf_counter()
+        state = sessions.derived(req.sessionId, session, "eq_state", prime)
+        (output, mags, mode), peak = (first, None) if first else measure(state.apply, bands)
+        out, meta = {"samples": output, "magnitudes": mags}, {"n": session.n}
+        if peak is None:
+            # Priming builds the whole state; later updates allocate the outputs
+            peak = state.nbytes if first else estimate_peak({}, out)
+        timing = {"queue": 0.0, "compute": time.perf_counter() - start, "peakBytes": peak}
+    # One multiply by the cached per-bin gain curve, then inverse rfft
+    elif session is not None:
+        # Reuse the cached forward FFT
+        fs = session.fs
+        out, meta, timing = dsp_pool.run(
+            "equalize", {"spectrum": session.spectrum}, fs=fs, bands=bands,
+            n=session.n, n_original=session.n_original,
+        )
+    else:
+        samples = request_samples(req)
+        fs = req.fs
 
-    # Inverse FFT → time domain
-    output = np.fft.ifft(fft_data).real[:n_original]
+        # Zero-padded real FFT first
+        out, meta, timing = dsp_pool.run(
+            "equalize", {"samples": samples}, fs=fs, bands=bands, sizing=FFT_SIZING,
+        )
 
-    return {
-        "samples": output.tolist(),
-        "frequencies": vis_freqs.tolist(),
-        "magnitudes": vis_mags.tolist()
-    }
+    # AFTER gain → for visualization
+    vis_freqs, vis_mags = spectrum_view(req, rfft_freqs(meta["n"], fs), out["magnitudes"])
+
+    response = with_timing(respond(request, {
+        "samples": out["samples"],
+        "frequencies": vis_freqs,
+        "magnitudes": vis_mags
+    }), timing)
+    response.headers["X-EQ-Mode"] = mode
+    return response
 
 
 @app.post("/ApplyEq")
-def applyeq_alias(req: EQRequest):
-    return apply_equalizer(req)
+def applyeq_alias(request: Request, req: EQRequest = Depends(payload(EQRequest))):
+    return apply_equalizer(request, req)
+
+
+# Block-by-block (overlap-add) mode for long recordings: constant memory,
+# and the first audio is sent before the whole file has been processed.
+# The body is raw little-endian float32 samples, streamed in order.
+@app.post("/applyEqualizer/stream")
+def apply_equalizer_stream(req: EQRequest = Depends(payload(EQRequest))):
+    session = resolve_session(req)
+    if session is not None:
+        samples, fs = session.samples, session.fs
+    else:
+        samples = np.asarray(req.samples, dtype=float)
+        fs = req.fs
+
+    block_size = req.blockSize
+    if block_size < 64 or block_size % 2:
+        raise HTTPException(status_code=422, detail="blockSize must be an even number >= 64")
+
+    blocks = stream_equalize(samples, fs, slider_bands(req.sliders), block_size)
+    return StreamingResponse(
+        (block.astype("<f4").tobytes() for block in blocks),
+        media_type=wire.OCTET_STREAM,
+        headers={"X-Sample-Rate": str(fs), "X-Length": str(len(samples))},
+    )
 
 
 # ===============================================================
 #   3️⃣ /spectrogram
 # ===============================================================
-@app.post("/spectrogram")
-def spectrogram(req: SpectrogramRequest):
-
-    samples = np.array(req.samples)
-    fs = req.fs
+def spectrogram_input(req):
+    """(session, samples, fs, precision, window size, hop size) of a SpectrogramRequest."""
+    session = resolve_session(req)
+    if session is not None:
+        samples, fs, precision = session.samples, session.fs, session.precision
+    else:
+        samples = request_samples(req)
+        fs, precision = req.fs, precision_of(req)
 
-    window_size = 2048
-    hop_size = window_size // 4
+    window_size = req.windowSize
+    hop_size = req.hopSize or window_size // 4
+    if window_size < 2 or hop_size < 1:
+        raise HTTPException(status_code=422, detail="windowSize must be >= 2 and hopSize >= 1")
+    return session, samples, fs, precision, window_size, hop_size
 
-    nfft = window_size
-    num_freq_bins = nfft // 2 + 1
 
-    # Window function
-    window = np.hanning(window_size)
+def spectrogram_key(req, window_size, hop_size):
+    """Session cache key of a spectrogram's frames."""
+    return ("spectrogram", window_size, hop_size, req.window, req.scale, req.dtype, req.padEnd)
 
-    frames = []
-    pos = 0
 
-    # Sliding window
-    while pos + window_size <= len(samples):
-        frame = samples[pos : pos + window_size] * window
-        fft_vals = np.fft.rfft(frame)
-        frames.append(np.abs(fft_vals))
-        pos += hop_size
-
-    magnitude_frames = np.array(frames)  # shape: [time][omega]
+@app.post("/spectrogram")
+@profiled
+def spectrogram(request: Request, req: SpectrogramRequest = Depends(payload(SpectrogramRequest))):
+    session, samples, fs, precision, window_size, hop_size = spectrogram_input(req)
 
-    # Axes
-    num_frames = magnitude_frames.shape[0]
+    nfft = window_size
+    num_freq_bins = nfft // 2 + 1
 
-    x = np.arange(num_frames) * hop_size / fs                # time
+    # Batched STFT over a strided view of the signal
+    timing = None
+
+    def compute():
+        nonlocal timing
+        try:
+            out, _, timing = dsp_pool.run(
+                "spectrogram", {"samples": samples},
+                window_size=window_size, hop_size=hop_size, window=req.window, scale=req.scale,
+                dtype=np.dtype(req.dtype), pad_end=req.padEnd, precision=precision,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return out["frames"]  # shape: [time][omega]
+
+    def time_axis(frames):
+        return np.arange(frames.shape[0]) * hop_size / fs
+
+    def build_pyramid():
+        frames = compute()
+        return MaxPyramid(time_axis(frames), frames)
+
+    if session is not None:
+        # Cache the frames (as a time pyramid) so zoom / pan skip the STFT
+        key = spectrogram_key(req, window_size, hop_size)
+        pyramid = sessions.derived(req.sessionId, session, key, build_pyramid)
+        x, magnitude_frames = pyramid.levels[0]
+    else:
+        pyramid = None
+        magnitude_frames = compute()
+        x = time_axis(magnitude_frames)                      # time
     y = np.arange(num_freq_bins) * fs / nfft                # freq
-    z = magnitude_frames.T                                  # freq × time
 
-    return {
-        "x": x.tolist(),
-        "y": y.tolist(),
-        "z": z.tolist()
-    }
+    # Level of detail along time, then frequency
+    with span("view"):
+        if req.maxFrames or req.tmin is not None or req.tmax is not None:
+            t_range = (req.tmin, req.tmax)
+            if pyramid is not None:
+                x, magnitude_frames = pyramid.view(req.maxFrames, t_range)
+            else:
+                x, magnitude_frames = decimate(x, magnitude_frames, req.maxFrames, t_range)
+        z = magnitude_frames.T                                  # freq × time
+        if req.maxFreqBins or req.fmin is not None or req.fmax is not None or req.logFreq:
+            y, z = decimate(y, z, req.maxFreqBins, (req.fmin, req.fmax), req.logFreq)
+
+    return with_timing(respond(request, {
+        "x": x,
+        "y": y,
+        "z": z
+    }), timing)
 
 
 # Alias for common misspelling
 @app.post("/spectogram")
-def spectogram_alias(req: SpectrogramRequest):
-    return spectrogram(req)
-
+def spectogram_alias(request: Request, req: SpectrogramRequest = Depends(payload(SpectrogramRequest))):
+    return spectrogram(request, req)
+
+
+# Streamed spectrogram: columns in time order as they are computed, so the
+# viewer can draw the start of a long file right away. The body is a series
+# of framed messages (wire.iter_decode splits them), told apart by meta "kind":
+#
+#   start     y (frequencies); frames, hop, windowSize, sampleRate
+#   columns   columns [frames, freq] from frame `start` (time `t0`)
+#   done      frames sent
+#
+# Frequency LOD (maxFreqBins, fmin / fmax, logFreq) applies to every batch;
+# time LOD does not, all frames are sent. A session's cached frames are sent
+# as they are, otherwise the STFT runs one batch ahead of the socket.
+def spectrogram_frames(req, session, samples, precision, window_size, hop_size):
+    """(frame count, iterator of (first frame, [frames, freq] magnitudes))."""
+    batch = req.batchFrames
+    pyramid = session.derived.get(spectrogram_key(req, window_size, hop_size)) if session else None
+    if pyramid is not None:
+        _, frames = pyramid.levels[0]
+        return len(frames), ((start, frames[start : start + batch]) for start in range(0, len(frames), batch))
+    n_frames = stft_frame_count(len(samples), window_size, hop_size, req.padEnd)
+    return n_frames, stft_batches(
+        samples, window_size, hop_size, req.window, req.scale, np.dtype(req.dtype), req.padEnd,
+        batch_frames=batch, precision=precision,
+    )
+
+
+def spectrogram_messages(req, request_id=None):
+    """Validate req; (frame count, generator of its framed start and columns messages)."""
+    session, samples, fs, precision, window_size, hop_size = spectrogram_input(req)
+    if req.batchFrames < 1:
+        raise HTTPException(status_code=422, detail="batchFrames must be >= 1")
+    try:
+        analysis_window(req.window, window_size)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    n_frames, batches = spectrogram_frames(req, session, samples, precision, window_size, hop_size)
+
+    y = np.arange(window_size // 2 + 1) * fs / window_size
+    freq_view = req.maxFreqBins or req.fmin is not None or req.fmax is not None or req.logFreq
+    f_range = (req.fmin, req.fmax)
+    meta = {"requestId": request_id} if request_id is not None else {}
+
+    def messages():
+        # The decimated axis depends on y alone
+        y_view = decimate(y, y, req.maxFreqBins, f_range, req.logFreq)[0] if freq_view else y
+        yield wire.encode({"y": y_view}, {
+            **meta, "kind": "start", "frames": n_frames, "hop": hop_size,
+            "windowSize": window_size, "sampleRate": fs,
+        })
+        for start, block in batches:
+            if freq_view:
+                block = decimate(y, block.T, req.maxFreqBins, f_range, req.logFreq)[1].T
+            yield wire.encode({"columns": block}, {
+                **meta, "kind": "columns", "start": int(start), "t0": start * hop_size / fs,
+            })
+
+    return n_frames, messages()
+
+
+def stream_message(kind, request_id=None, **meta):
+    """An array-less framed message (done / cancelled / error)."""
+    if request_id is not None:
+        meta["requestId"] = request_id
+    return wire.encode({}, {**meta, "kind": kind})
+
+
+# A client that aborts the request (new file, other mode) closes the
+# connection, and the STFT stops after the batch in progress
+@app.post("/spectrogram/stream")
+def spectrogram_stream(req: SpectrogramRequest = Depends(payload(SpectrogramRequest))):
+    n_frames, messages = spectrogram_messages(req)
+    done = stream_message("done", frames=n_frames)
+    return StreamingResponse(itertools.chain(messages, [done]), media_type=wire.FRAMED)
+
+
+# The same messages over one WebSocket that the viewer keeps open. Each client
+# message is a request: JSON text with the SpectrogramRequest fields, or a
+# framed binary message with those fields as meta and `samples` as an array.
+# An optional requestId is echoed in every reply. A new request cancels the
+# one in flight, as does {"cancel": true}; a cancelled stream ends with a
+# "cancelled" message. Errors come back as "error" messages (status, detail)
+# and leave the socket open.
+def ws_spectrogram_request(message):
+    """(requestId, SpectrogramRequest or None for a cancel) of a WebSocket message."""
+    if message.get("bytes") is not None:
+        fields, arrays = wire.decode(message["bytes"], wire.FRAMED)
+    else:
+        fields, arrays = json.loads(message["text"]), {}
+    if not isinstance(fields, dict):
+        raise ValueError("message must be a JSON object")
+    request_id = fields.get("requestId")
+    if fields.get("cancel"):
+        return request_id, None
+    return request_id, with_arrays(SpectrogramRequest, fields, arrays)
+
+
+@app.websocket("/spectrogram/ws")
+async def spectrogram_ws(websocket: WebSocket):
+    await websocket.accept()
+    task, task_id = None, None
+    streaming = False  # the current task has not queued its done / error message yet
+
+    async def stream(request_id, req):
+        nonlocal streaming
+        messages = None
+        try:
+            n_frames, messages = await run_in_threadpool(spectrogram_messages, req, request_id)
+            # next() runs in a worker thread; cancelling waits for the batch in progress
+            while (chunk := await run_in_threadpool(next, messages, None)) is not None:
+                await websocket.send_bytes(chunk)
+            end = stream_message("done", request_id, frames=n_frames)
+        except HTTPException as e:
+            end = stream_message("error", request_id, status=e.status_code, detail=e.detail)
+        except Exception as e:
+            end = stream_message("error", request_id, status=500, detail=str(e))
+        finally:
+            if messages is not None:
+                messages.close()
+        streaming = False
+        await websocket.send_bytes(end)
+
+    async def cancel():
+        """Stop the current task; True if its stream had not ended."""
+        nonlocal streaming
+        if task is None:
+            return False
+        running, streaming = streaming, False
+        task.cancel()
+        # A closed socket fails the task's last send
+        with suppress(asyncio.CancelledError, Exception):
+            await task
+        return running
 
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if await cancel():
+                await websocket.send_bytes(stream_message("cancelled", task_id))
+            try:
+                request_id, req = ws_spectrogram_request(message)
+            except (ValueError, KeyError, TypeError) as e:
+                # Covers bad JSON, non-object messages and malformed framed headers
+                await websocket.send_bytes(stream_message("error", status=422, detail=str(e)))
+                continue
+            if req is not None:
+                task_id, streaming = request_id, True
+                task = asyncio.create_task(stream(request_id, req))
+    finally:
+        await cancel()
+
+
+
+
+def session_output(req):
+    """EQ output for a saveEQ request that names a session instead of samples."""
+    session = get_session(req.sessionId)
+    if not req.sliders:
+        raise HTTPException(status_code=422, detail="sliders are required with sessionId")
+    bands = slider_bands(req.sliders)
+    # An incremental EQ state (slider drags) usually holds this result already
+    state = session.derived.get("eq_state")
+    if state is not None:
+        output, _, _ = state.apply(bands)
+    else:
+        out, _, _ = dsp_pool.run(
+            "equalize", {"spectrum": session.spectrum}, fs=session.fs, bands=bands,
+            n=session.n, n_original=session.n_original,
+        )
+        output = out["samples"]
+    return output, int(session.fs)
 
 
 @app.post("/saveEQ")
-def save_eq(req: EQRequestSave):
+def save_eq(req: EQRequestSave = Depends(payload(EQRequestSave))):
     
     try:
-        samples = np.array(req.samples, dtype=np.float32)
-        sample_rate = req.sampleRate
+        if req.sessionId:
+            samples, sample_rate = session_output(req)
+        elif req.samples is not None and req.sampleRate:
+            samples, sample_rate = np.asarray(req.samples, dtype=np.float32), req.sampleRate
+        else:
+            raise HTTPException(status_code=422, detail="Provide either sessionId + sliders or samples + sampleRate")
         mode = req.mode
 
-        # Scale to int16 for WAV
-        samples_int16 = np.int16(np.clip(samples, -1, 1) * 32767)
-
         # Prepare output path
         public_dir = os.path.abspath(os.path.join(os.getcwd(), "..", "client", "public"))
         os.makedirs(public_dir, exist_ok=True)
         output_filename = f"{mode}_output.wav"
         output_path = os.path.join(public_dir, output_filename)
 
-        # Save WAV
-        write(output_path, sample_rate, samples_int16)
+        # Save as 16-bit WAV, converted and written block by block
+        frames = write_wav(output_path, sample_rate, samples)
 
         # Return relative path from project root
         relative_path = os.path.join("public", output_filename).replace("\\", "/")
-        return {"url": relative_path}
+        return {"url": relative_path, "frames": frames, "sampleRate": sample_rate}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/saveEq")
-def saveeq_alias(req: EQRequestSave):
+def saveeq_alias(req: EQRequestSave = Depends(payload(EQRequestSave))):
     return save_eq(req)
 
 def rms(x):
     return np.sqrt(np.mean(x**2))
 
 # --------------------
-# Load Demucs model globally
+# Separation models: loaded once, shared by all requests
 # --------------------
-model_music = pretrained.get_model('htdemucs_6s')
-model_music.eval()
+# torch / demucs are only imported when a model is first needed, so the DSP
+# endpoints start instantly. HARMONIX_DSP_ONLY=1 disables the AI endpoints
+# entirely; HARMONIX_PREFETCH_MODELS ("all" or a comma separated list) warms
+# models in a background thread after startup.
+DSP_ONLY = os.environ.get("HARMONIX_DSP_ONLY", "0").lower() in ("1", "true", "yes")
+PREFETCH_MODELS = os.environ.get("HARMONIX_PREFETCH_MODELS", "")
+# Point HARMONIX_MODEL_DIR at a local checkpoint directory to run offline:
+#   <dir>/demucs/                          htdemucs_6s.yaml + its .th weights
+#   <dir>/MultiDecoderDPRNN/pytorch_model.bin
+MODEL_DIR = os.environ.get("HARMONIX_MODEL_DIR")
+MODEL_CONCURRENCY = int(os.environ.get("HARMONIX_MODEL_CONCURRENCY", "1"))
+MODEL_WAIT_SECONDS = float(os.environ.get("HARMONIX_MODEL_WAIT_SECONDS", "300"))
+# Default inference variant (see model_variants.py); requests can override it
+MODEL_VARIANT = os.environ.get("HARMONIX_MODEL_VARIANT", "float")
+
+MUSIC_MODEL = "htdemucs_6s"
+HUMAN_MODEL = "MultiDecoderDPRNN"
+
+
+def load_music_model():
+    from demucs import pretrained
+
+    repo = Path(MODEL_DIR, "demucs") if MODEL_DIR else None
+    if repo is not None and not repo.is_dir():
+        repo = None
+    model = pretrained.get_model(MUSIC_MODEL, repo=repo)
+    model.eval()
+    return model
+
+
+def load_human_model():
+    import torch
+    from model import MultiDecoderDPRNN
 
+    import pytorch_lightning.callbacks.model_checkpoint
+    import pytorch_lightning.callbacks.early_stopping
+    torch.serialization.add_safe_globals([
+        pytorch_lightning.callbacks.model_checkpoint.ModelCheckpoint,
+        pytorch_lightning.callbacks.early_stopping.EarlyStopping
+    ])
+
+    source = "JunzheJosephZhu/MultiDecoderDPRNN"
+    if MODEL_DIR:
+        local = os.path.join(MODEL_DIR, HUMAN_MODEL, "pytorch_model.bin")
+        if os.path.exists(local):
+            source = local
+    print(f"Loading pre-trained model from {source}...")
+    model = MultiDecoderDPRNN.from_pretrained(source)
+    model.eval()
 
-@app.post("/MusicAi")
-async def process_audio(file: UploadFile = File(...), sliders: str = Form(...)):
+    # Use GPU if available
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+    print(f"Model loaded on {device}")
+    return model
+
+
+models = ModelRegistry()
+models.register(MUSIC_MODEL, load_music_model, max_concurrency=MODEL_CONCURRENCY)
+models.register(HUMAN_MODEL, load_human_model, max_concurrency=MODEL_CONCURRENCY)
+# Variants are derived from the loaded float model, e.g. "MultiDecoderDPRNN:int8"
+for _name in (MUSIC_MODEL, HUMAN_MODEL):
+    for _variant in VARIANTS[1:]:
+        models.register(
+            variant_name(_name, _variant),
+            lambda name=_name, variant=_variant: make_variant(models.load(name), variant),
+            max_concurrency=MODEL_CONCURRENCY,
+        )
+
+
+def requested_prefetch_names():
+    if DSP_ONLY or not PREFETCH_MODELS.strip():
+        return []
+    if PREFETCH_MODELS.strip().lower() == "all":
+        return [MUSIC_MODEL, HUMAN_MODEL]
+    return [name.strip() for name in PREFETCH_MODELS.split(",") if name.strip()]
+
+
+def prefetch_names():
+    # Unknown names are skipped (and logged at startup) so /ready can still pass
+    return [name for name in requested_prefetch_names() if name in models]
+
+
+def prefetch_models(names):
+    for name in names:
+        try:
+            models.load(name)
+        except Exception as e:
+            print(f"Failed to load {name}: {e}")
+
+
+@app.on_event("startup")
+def start_prefetch():
+    # Don't block startup: the DSP endpoints are usable while models load
+    unknown = [name for name in requested_prefetch_names() if name not in models]
+    if unknown:
+        print(f"Ignoring unknown models in HARMONIX_PREFETCH_MODELS: {', '.join(unknown)}")
+    names = prefetch_names()
+    if names:
+        threading.Thread(target=prefetch_models, args=(names,), daemon=True).start()
+
+
+# Separated stems keyed by audio content hash + model, so a slider change
+# is only a re-mix. Disk entries are float32 (or float16) .npy files.
+stem_cache = StemCache(
+    max_bytes=int(os.environ.get("HARMONIX_STEM_CACHE_MB", "1024")) * 1024 * 1024,
+    cache_dir=os.environ.get(
+        "HARMONIX_STEM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "harmonix-stems")
+    ) or None,
+    disk_max_bytes=int(os.environ.get("HARMONIX_STEM_CACHE_DISK_MB", "4096")) * 1024 * 1024,
+    dtype=os.environ.get("HARMONIX_STEM_CACHE_DTYPE", "float32"),
+)
+
+
+@app.get("/models")
+def model_status():
+    return {**models.status(), "stemCache": stem_cache.stats()}
+
+
+@app.get("/ready")
+def readiness():
+    """200 once the DSP endpoints and every prefetched model are ready."""
+    status = models.status()
+    pending = [name for name in prefetch_names() if status[name]["state"] != "ready"]
+    content = {
+        "ready": not pending,
+        "mode": "dsp-only" if DSP_ONLY else "full",
+        "warm": [name for name, st in status.items() if st["state"] == "ready"],
+        "pending": pending,
+        "torchLoaded": "torch" in sys.modules,
+    }
+    return JSONResponse(content, status_code=200 if not pending else 503)
+
+
+def model_variant(name, variant):
+    """Registry name for the requested variant of a model (422 if unknown)."""
+    variant = variant or MODEL_VARIANT
+    if variant not in VARIANTS:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown variant {variant!r}; expected one of {list(VARIANTS)}"
+        )
+    return variant_name(name, variant)
+
+
+def require_ai():
+    if DSP_ONLY:
+        raise HTTPException(status_code=503, detail="AI endpoints are disabled (HARMONIX_DSP_ONLY)")
+
+
+@contextmanager
+def use_model(name):
+    """Borrow a shared model; load failures and saturation become 503s."""
+    require_ai()
+    configure_torch()
+    try:
+        models.load(name)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model {name} is unavailable: {e}")
+    try:
+        with models.use(name, timeout=MODEL_WAIT_SECONDS) as model:
+            yield model
+    except ModelBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+# Separations run as jobs on a bounded thread pool (see jobs.py) so the event
+# loop keeps serving the DSP endpoints. Per-model concurrency is still capped
+# by the registry; HARMONIX_JOB_QUEUE caps queued + running jobs (429 beyond).
+jobs = JobQueue(
+    max_workers=int(os.environ.get("HARMONIX_JOB_WORKERS", "2")),
+    max_pending=int(os.environ.get("HARMONIX_JOB_QUEUE", "8")),
+    keep_finished=int(os.environ.get("HARMONIX_JOB_KEEP", "32")),
+    keep_seconds=float(os.environ.get("HARMONIX_JOB_KEEP_SECONDS", "600")),
+)
+
+
+def submit_job(kind, fn):
+    try:
+        return jobs.submit(kind, fn)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+
+async def job_result(job):
+    """Await a job run for a synchronous endpoint. Nobody can fetch its result
+    from /jobs later, so the job (and its result arrays) is dropped as soon
+    as it finishes instead of being kept for HARMONIX_JOB_KEEP_SECONDS."""
+    job.future.add_done_callback(lambda _: jobs.discard(job.id))
+    return await asyncio.wrap_future(job.future)
+
+
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+
+@app.get("/jobs")
+def job_stats():
+    return jobs.stats()
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return get_job(job_id).status()
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result_endpoint(request: Request, job_id: str):
+    job = get_job(job_id)
+    if job.state == "error":
+        if isinstance(job.exception, HTTPException):
+            raise job.exception
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.state != "done":
+        return JSONResponse(job.status(), status_code=409)
+    return respond(request, job.result)
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = get_job(job_id)
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is {job.state}; only queued jobs can be cancelled")
+    return job.status()
+
+
+# Segmented Demucs inference (see separation.py): memory is bounded by the
+# segment length, and /MusicAi/stream sends each mixed segment as it is ready
+DEMUCS_SEGMENT_SECONDS = float(os.environ.get("HARMONIX_DEMUCS_SEGMENT_SECONDS", "30"))
+DEMUCS_OVERLAP_SECONDS = float(os.environ.get("HARMONIX_DEMUCS_OVERLAP_SECONDS", "1"))
+# torch's thread count is process-wide, so it is server configuration only
+TORCH_THREADS = int(os.environ.get("HARMONIX_TORCH_THREADS", "0")) or None
+_torch_configured = False
+
+
+def configure_torch():
+    """Apply HARMONIX_TORCH_THREADS once, before the first model is used."""
+    global _torch_configured
+    if _torch_configured:
+        return
+    _torch_configured = True
+    if TORCH_THREADS:
+        import torch
+        torch.set_num_threads(TORCH_THREADS)
+
+# The client's slider names, mapped to the htdemucs_6s sources at the stem
+# indices they used to be hard-coded to (0, 2, 3, 5 of drums, bass, other,
+# vocals, guitar, piano). Any other name is looked up in model.sources.
+LEGACY_STEM_ALIASES = {'drums': 'drums', 'vocals': 'other', 'violin': 'vocals', 'bass_guitar': 'piano'}
+
+
+def parse_sliders(sliders):
     # Parse sliders (expected JSON string)
     try:
-        slider_items = json.loads(sliders)
+        return json.loads(sliders)
     except Exception:
-        slider_items = []
+        return []
+
 
-    # Read uploaded audio file
-    data_bytes = await file.read()
+def read_upload(upload, stereo=False, normalize=False):
+    """Decode a spooled upload into [channels, time] float32 audio."""
     try:
-        import soundfile as sf
-        audio_np, fs = sf.read(io.BytesIO(data_bytes), dtype='float32')
+        return read_audio(upload.path, stereo=stereo, normalize=normalize, mmap_bytes=UPLOAD_MMAP_BYTES)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
 
-    samples = np.array(audio_np, dtype=np.float32)
-    # Ensure 2D audio
-    if samples.ndim == 1:
-        samples = np.stack([samples, samples], axis=1)
-
-    # Normalize
-    denom = np.max(np.abs(samples)) if np.max(np.abs(samples)) > 0 else 1.0
-    samples = samples / denom
-    audio_tensor = torch.from_numpy(samples.T).float()
 
-    # Separate
-    with torch.no_grad():
-        sources = apply_model(model_music, audio_tensor.unsqueeze(0), device='cpu')[0]
+def read_music_input(upload):
+    """Normalized stereo [channels, time] float32 audio for demucs."""
+    return read_upload(upload, stereo=True, normalize=True)
 
-    # Map slidername to stem index (adjust based on Demucs output)
-    stem_names = ['drums', 'vocals', 'violin', 'bass_guitar']
-    stem_indices = [0, 2, 3, 5]
-    stem_map = dict(zip(stem_names, stem_indices))
 
-    # Apply gains
-    final_mix = np.zeros_like(samples)
+async def queue_upload_job(kind, file, work):
+    """Spool `file` to disk, then queue work(upload, job); the file goes when the job does."""
+    upload = await spool_upload(file, UPLOAD_DIR)
+    try:
+        job = submit_job(kind, lambda job: work(upload, job))
+    except BaseException:
+        upload.discard()
+        raise
+    job.future.add_done_callback(lambda _: upload.discard())
+    return job
+
+
+def stem_names(meta, model_name):
+    """Source names of cached stems (model.sources at separation time)."""
+    if "sources" in meta:
+        return list(meta["sources"])
+    # Entries cached before names were recorded
+    with use_model(model_name) as model_music:
+        return list(model_music.sources)
+
+
+def music_gains(slider_items, names):
+    """Per-stem gains from the AI sliders; repeated names add up."""
+    gains = np.zeros(len(names))
     for gain_item in slider_items:
         name = gain_item.get('name') if isinstance(gain_item, dict) else getattr(gain_item, 'name', None)
         gain_val = gain_item.get('value') if isinstance(gain_item, dict) else getattr(gain_item, 'value', 1.0)
-        if name in stem_map:
-            idx = stem_map[name]
-            mono_audio = sources[idx].mean(dim=0).numpy()
-            gained_audio = mono_audio * gain_val
-            final_mix[:, 0] += gained_audio
-            final_mix[:, 1] += gained_audio
-
-    # Normalize final mix
-    max_val = np.max(np.abs(final_mix))
-    if max_val > 0:
-        final_mix = final_mix / max_val
-
-    # Compute FFT
-    N = final_mix.shape[0]
-    fft_vals = np.fft.fft(final_mix[:, 0])  # left channel
-    fft_freqs = np.fft.fftfreq(N, 1 / fs)
-    positive_freqs = fft_freqs[: N // 2].tolist()
-    magnitudes = np.abs(fft_vals[: N // 2]).tolist()
+        source = LEGACY_STEM_ALIASES.get(name, name)
+        if source in names:
+            gains[names.index(source)] += gain_val
+    return gains
+
+
+def mono_stems(key, sources, meta):
+    """Cached per-stem mono means ([stem, time]) of [stem, channel, time] stems."""
+    monos, _ = stem_cache.get_or_compute(
+        f"{key}-mono", lambda: (sources.mean(axis=1, dtype=np.float32), meta)
+    )
+    return monos
+
+
+def music_mix(sources, gains):
+    """Gain-weighted mono mix of [stem, time] mono or [stem, channel, time] sources."""
+    final_mix = np.zeros(sources.shape[-1], dtype=np.float32)
+    for i in np.flatnonzero(gains):
+        source = sources[i]
+        mono = source if source.ndim == 1 else source.mean(axis=0, dtype=np.float32)
+        final_mix += mono * float(gains[i])
+    return final_mix
+
+
+def stereo_mix(sources, gains):
+    """Gain-weighted [channel, time] mix of [stem, channel, time] sources."""
+    mix = np.zeros(sources.shape[1:], dtype=np.float32)
+    scratch = np.empty_like(mix)
+    for i in np.flatnonzero(gains):
+        np.multiply(sources[i], np.float32(gains[i]), out=scratch)
+        mix += scratch
+    return mix
+
+
+def remix_spectrum(key, sources, meta, gains, scale=1.0, points=None):
+    """Positive-frequency (frequencies, magnitudes) of a remix of sources.
+
+    Each source's rfft is cached next to its stems (under key), so a new
+    set of gains only sums cached spectra instead of running a full FFT.
+    """
+    with span("spectra"):
+        spectra, _ = stem_cache.get_or_compute(
+            f"{key}-rfft", lambda: (source_spectra(sources), meta), dtype=np.complex64
+        )
+    with span("fft"):
+        n = sources.shape[-1]
+        magnitudes = np.abs(mix_spectrum(spectra, gains)[: n // 2]) * scale
+        frequencies = rfft_freqs(n, meta["fs"])[: n // 2]
+        if points:
+            frequencies, magnitudes = decimate(frequencies, magnitudes, points)
+    return frequencies, magnitudes
+
+
+@profiled
+def music_ai(upload, slider_items, model_name, segment, overlap, progress=None, points=None):
+    """Separate (or reuse cached stems), mix and FFT. Runs on a job worker."""
+
+    def separate():
+        with span("decode"):
+            audio, fs = read_music_input(upload)
+        with span("inference"), use_model(model_name) as model_music:
+            sources = separate_demucs(
+                model_music, audio, fs,
+                segment_seconds=segment, overlap_seconds=overlap,
+                progress=progress,
+            )
+            names = list(model_music.sources)
+        return sources, {"fs": int(fs), "sources": names}  # [stem, channel, time]
+
+    # Stems are cached per (audio, model): a slider change skips inference
+    key = stem_cache.key(
+        upload.sha256, MUSIC_MODEL, segment=segment, overlap=overlap, variant=model_name
+    )
+    sources, meta = stem_cache.get_or_compute(key, separate)
+    fs = meta["fs"]
+    names = stem_names(meta, model_name)
+
+    with span("mix"):
+        # Apply gains to the cached mono stems (both output channels carry the same mix)
+        monos = mono_stems(key, sources, meta)
+        gains = music_gains(slider_items, names)
+        final_mix = music_mix(monos, gains)
+
+        # Normalize final mix
+        max_val = np.max(np.abs(final_mix))
+        scale = 1 / max_val if max_val > 0 else 1.0
+        if max_val > 0:
+            final_mix = final_mix / max_val
+
+    # Spectrum of the mix from the stems' cached spectra
+    positive_freqs, magnitudes = remix_spectrum(key, monos, meta, gains, scale, points)
 
     return {
-        "samples": final_mix[:, 0].tolist(),  # left channel
+        "samples": final_mix,  # left channel
         "sampleRate": int(fs),
         "frequencies": positive_freqs,
         "magnitudes": magnitudes,
+        # For /MusicAi/remix: the cached stems and their names
+        "stemsId": key,
+        "sources": names,
     }
 
 
+def check_segments(segment, overlap):
+    if segment <= 0 or overlap < 0:
+        raise HTTPException(status_code=422, detail="segment must be > 0 and overlap >= 0 seconds")
 
 
+async def queue_music_ai(file, sliders, segment, overlap, variant, points=None):
+    require_ai()
+    check_segments(segment, overlap)
+    model_name = model_variant(MUSIC_MODEL, variant)
+    slider_items = parse_sliders(sliders)
 
+    # The upload is spooled to a temp file, not held in memory
+    return await queue_upload_job("MusicAi", file, lambda upload, job: music_ai(
+        upload, slider_items, model_name, segment, overlap,
+        progress=job.set_progress, points=points,
+    ))
 
 
-import soundfile as sf
+@app.post("/MusicAi")
+async def process_audio(
+    request: Request,
+    file: UploadFile = File(...),
+    sliders: str = Form(...),
+    segment: float = Form(DEMUCS_SEGMENT_SECONDS),
+    overlap: float = Form(DEMUCS_OVERLAP_SECONDS),
+    variant: Optional[str] = Form(None),
+    points: Optional[int] = Form(None, gt=0),
+):
+    job = await queue_music_ai(file, sliders, segment, overlap, variant, points)
+    # Encoding full-length arrays takes seconds; keep it off the event loop
+    return await run_in_threadpool(respond, request, await job_result(job))
+
+
+@app.post("/jobs/MusicAi", status_code=202)
+async def submit_music_job(
+    file: UploadFile = File(...),
+    sliders: str = Form(...),
+    segment: float = Form(DEMUCS_SEGMENT_SECONDS),
+    overlap: float = Form(DEMUCS_OVERLAP_SECONDS),
+    variant: Optional[str] = Form(None),
+    points: Optional[int] = Form(None, gt=0),
+):
+    job = await queue_music_ai(file, sliders, segment, overlap, variant, points)
+    return job.status()
+
+
+# Streams the mix segment by segment as back-to-back framed messages
+# (wire.FRAMED), each with meta {start, sampleRate} and a `samples` array.
+# The peak isn't known until the end, so streamed blocks are not normalized.
+@app.post("/MusicAi/stream")
+async def process_audio_stream(
+    file: UploadFile = File(...),
+    sliders: str = Form(...),
+    segment: float = Form(DEMUCS_SEGMENT_SECONDS),
+    overlap: float = Form(DEMUCS_OVERLAP_SECONDS),
+    variant: Optional[str] = Form(None),
+):
+    require_ai()
+    check_segments(segment, overlap)
+    model_name = model_variant(MUSIC_MODEL, variant)
+
+    slider_items = parse_sliders(sliders)
+    # Mixed segments go from the job to the response through a short queue;
+    # stop is set once the client has gone so the job can give up its worker
+    chunks = queue.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def blocks(upload):
+        """Yield (start, stems, gains, fs) per segment."""
+        key = stem_cache.key(
+            upload.sha256, MUSIC_MODEL, segment=segment, overlap=overlap, variant=model_name
+        )
+        cached = stem_cache.get(key)
+        if cached is not None:
+            sources, meta = cached
+            fs = meta["fs"]
+            gains = music_gains(slider_items, stem_names(meta, model_name))
+            step = max(int(segment * fs), 1)
+            for start in range(0, sources.shape[-1], step):
+                yield start, sources[..., start : start + step], gains, fs
+            return
+        audio, fs = read_music_input(upload)
+        with use_model(model_name) as model_music:
+            gains = music_gains(slider_items, list(model_music.sources))
+            for start, stems in demucs_segments(
+                model_music, audio, fs,
+                segment_seconds=segment, overlap_seconds=overlap,
+            ):
+                yield start, stems, gains, fs
+
+    def produce(upload, job):
+        for start, stems, gains, fs in blocks(upload):
+            chunk = wire.encode(
+                {"samples": music_mix(stems, gains)},
+                {"start": int(start), "sampleRate": int(fs)},
+            )
+            while not stop.is_set():
+                try:
+                    chunks.put(chunk, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            if stop.is_set():
+                return
+
+    # Queued like the other AI routes (429 when full); decoding runs in the job
+    job = await queue_upload_job("MusicAi", file, produce)
+    job.future.add_done_callback(lambda _: jobs.discard(job.id))
+
+    async def next_chunk():
+        """The next segment, or None once the job is done (raising its error)."""
+        while True:
+            try:
+                return await run_in_threadpool(chunks.get, True, 0.5)
+            except queue.Empty:
+                if job.future.done() and chunks.empty():
+                    await asyncio.wrap_future(job.future)
+                    return None
+
+    # Wait for the first segment so decode / model errors still get a status code
+    try:
+        first = await next_chunk()
+    except BaseException:
+        stop.set()
+        raise
+
+    async def body():
+        try:
+            chunk = first
+            while chunk is not None:
+                yield chunk
+                chunk = await next_chunk()
+        finally:
+            stop.set()
+
+    return StreamingResponse(body(), media_type=wire.FRAMED)
+
+
+# Stereo remix of cached stems, without re-uploading or re-separating.
+# `samples` is interleaved float32 (L R L R ...); with Accept:
+# application/octet-stream the body is just those bytes, described by the
+# X-Sample-Rate and X-Channels headers.
+@app.post("/MusicAi/remix")
+@profiled
+def remix_stems(request: Request, req: StemRemixRequest = Depends(payload(StemRemixRequest))):
+    # Ids are cache keys (also file names in the disk tier)
+    cached = stem_cache.get(req.stemsId) if re.fullmatch(r"[\w-]+", req.stemsId) else None
+    if cached is None or cached[0].ndim != 3:
+        raise HTTPException(status_code=404, detail=f"Unknown or evicted stems: {req.stemsId}; rerun /MusicAi")
+    sources, meta = cached
+    names = stem_names(meta, MUSIC_MODEL)
+    unknown = sorted(set(req.gains) - set(names))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown sources {unknown}; this model has {names}")
+    gains = np.array([req.gains.get(name, 0.0) for name in names])
+
+    with span("mix"):
+        mix = stereo_mix(sources, gains)
+        peak = float(np.abs(mix).max(initial=0.0))
+        scale = 1 / peak if req.normalize and peak > 0 else 1.0
+        if scale != 1.0:
+            mix *= np.float32(scale)
+        interleaved = np.ascontiguousarray(mix.T).reshape(-1)
+
+    content = {
+        "samples": interleaved,
+        "sampleRate": int(meta["fs"]),
+        "channels": int(mix.shape[0]),
+        "sources": [name for name in names if name in req.gains],
+    }
+    if req.spectrum:
+        monos = mono_stems(req.stemsId, sources, meta)
+        content["frequencies"], content["magnitudes"] = remix_spectrum(
+            req.stemsId, monos, meta, gains, scale, req.points
+        )
+    response = respond(request, content)
+    response.headers["X-Sample-Rate"] = str(content["sampleRate"])
+    response.headers["X-Channels"] = str(content["channels"])
+    return response
 
 
-@app.post("/HumanAi")
-async def HumanAi(file: UploadFile = File(...), sliders: str = Form(...)):
-    SAMPLE_URL = "https://josephzhu.com/Multi-Decoder-DPRNN/examples/2_mixture.wav"
-    MODEL_DEF_URL = "https://raw.githubusercontent.com/asteroid-team/asteroid/master/egs/wsj0-mix-var/Multi-Decoder-DPRNN/model.py"
 
-    from model import MultiDecoderDPRNN
 
-    import pytorch_lightning.callbacks.model_checkpoint
-    import pytorch_lightning.callbacks.early_stopping
-    torch.serialization.add_safe_globals([
-    pytorch_lightning.callbacks.model_checkpoint.ModelCheckpoint,
-    pytorch_lightning.callbacks.early_stopping.EarlyStopping
-])
-    print("Loading pre-trained model from Hugging Face...")
-    model_human = MultiDecoderDPRNN.from_pretrained("JunzheJosephZhu/MultiDecoderDPRNN")
-    model_human.eval()
-    
-    # Use GPU if available
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model_human.to(device)
-    print(f"Model loaded on {device}")
 
-    # Read uploaded file
-    data_bytes = await file.read()
-    try:
-        audio_np, fs = sf.read(io.BytesIO(data_bytes), dtype='float32')
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
 
-    # Convert to torch tensor with shape (channels, time)
-    if audio_np.ndim == 1:
-        mixture = torch.tensor(audio_np).unsqueeze(0)
-    else:
-        mixture = torch.tensor(audio_np.T)
-    mixture = mixture.to(device)
 
-    # ✅ 2. SEPARATE SOURCES (same as original script)
-    with torch.no_grad():
-        # separate() returns the estimated sources tensor
-        est_sources = model_human.separate(mixture)
+@profiled
+def human_ai(upload, slider_items, model_name, slice_size, slice_stride, progress=None, points=None):
+    """Separate (or reuse cached sources), mix and FFT. Runs on a job worker."""
 
-    est_sources = est_sources.cpu()
+    def separate():
+        with span("decode"):
+            audio, fs = read_upload(upload)
 
-    if est_sources.ndim == 3 and est_sources.shape[0] == 1:
-        est_sources = est_sources.squeeze(0)
+        import torch
+        import torchaudio
 
-    for i in range(est_sources.shape[0]):
-        output_filename = rf"output_source_{i+1}.wav"
-        # torchaudio.save expects (channels, time). Unsqueeze if needed.
-        source = est_sources[i].unsqueeze(0)
-        
-        torchaudio.save(output_filename, source, fs)
-        print(f"Saved: {output_filename}")
+        # Shares the decoded (channels, time) buffer
+        mixture = torch.from_numpy(audio)
 
-    # ✅ 4. APPLY SLIDER GAINS
-    final_mix = torch.zeros(est_sources.shape[1], dtype=est_sources.dtype)
+        # ✅ 2. SEPARATE SOURCES (same as original script)
+        with span("inference"), use_model(model_name) as model_human, torch.no_grad():
+            if progress:
+                progress(0.05)
+            device = next(model_human.parameters()).device
+            mixture = mixture.to(device)
+            # separate() returns the estimated sources tensor
+            est_sources = model_human.separate(
+                mixture, slice_size=slice_size, slice_stride=slice_stride
+            )
+        if progress:
+            progress(0.9)
 
-    try:
-        slider_items = json.loads(sliders)
-    except Exception:
-        slider_items = []
+        est_sources = est_sources.cpu()
+
+        if est_sources.ndim == 3 and est_sources.shape[0] == 1:
+            est_sources = est_sources.squeeze(0)
+
+        for i in range(est_sources.shape[0]):
+            output_filename = rf"output_source_{i+1}.wav"
+            # torchaudio.save expects (channels, time). Unsqueeze if needed.
+            source = est_sources[i].unsqueeze(0)
+
+            torchaudio.save(output_filename, source, fs)
+            print(f"Saved: {output_filename}")
+        return est_sources.numpy(), {"fs": int(fs)}  # [source, time]
+
+    # Separated sources are cached per (audio, model)
+    key = stem_cache.key(
+        upload.sha256, HUMAN_MODEL,
+        slice=slice_size, stride=slice_stride, variant=model_name,
+    )
+    est_sources, meta = stem_cache.get_or_compute(key, separate)
+    fs = meta["fs"]
+
+    # ✅ 4. APPLY SLIDER GAINS
+    with span("mix"):
+        final_mix = np.zeros(est_sources.shape[1], dtype=np.float32)
+        gains = np.zeros(est_sources.shape[0])
 
-    for i, slider in enumerate(slider_items):
-        if i < est_sources.shape[0]:
-            val = slider.get('value') if isinstance(slider, dict) else getattr(slider, 'value', 1.0)
-            final_mix += est_sources[i] * val
+        for i, slider in enumerate(slider_items):
+            if i < est_sources.shape[0]:
+                val = slider.get('value') if isinstance(slider, dict) else getattr(slider, 'value', 1.0)
+                final_mix += est_sources[i] * val
+                gains[i] += val
 
-    # ✅ 5. FFT (positive frequencies only)
-    n = final_mix.shape[0]
-    fft_data = torch.fft.fft(final_mix)
-    magnitudes = torch.abs(fft_data)[: n // 2].numpy()
-    frequencies = np.fft.fftfreq(n, d=1 / fs)[: n // 2]
+    # ✅ 5. Spectrum (positive frequencies only) from the cached source spectra
+    frequencies, magnitudes = remix_spectrum(key, est_sources, meta, gains, points=points)
 
-    samples_out = final_mix.numpy().tolist()
+    samples_out = final_mix
 
     return {
         "samples": samples_out,
-        "frequencies": frequencies.tolist(),
-        "magnitudes": magnitudes.tolist(),
+        "frequencies": frequencies,
+        "magnitudes": magnitudes,
         "sampleRate": int(fs)
-    }
\ No newline at end of file
+    }
+
+
+def check_slices(slice_size, slice_stride):
+    # forward_wav defaults the stride to half a slice
+    stride = slice_stride if slice_stride is not None else slice_size // 2
+    if slice_size <= 0 or not 0 < stride <= slice_size:
+        raise HTTPException(
+            status_code=422,
+            detail="sliceSize must be > 0 and sliceStride in 1..sliceSize (default sliceSize // 2)",
+        )
+
+
+async def queue_human_ai(file, sliders, slice_size, slice_stride, variant, points=None):
+    require_ai()
+    check_slices(slice_size, slice_stride)
+    model_name = model_variant(HUMAN_MODEL, variant)
+    slider_items = parse_sliders(sliders)
+
+    return await queue_upload_job("HumanAi", file, lambda upload, job: human_ai(
+        upload, slider_items, model_name, slice_size, slice_stride,
+        progress=job.set_progress, points=points,
+    ))
+
+
+@app.post("/HumanAi")
+async def HumanAi(
+    request: Request,
+    file: UploadFile = File(...),
+    sliders: str = Form(...),
+    sliceSize: int = Form(32000),
+    sliceStride: Optional[int] = Form(None),
+    variant: Optional[str] = Form(None),
+    points: Optional[int] = Form(None, gt=0),
+):
+    job = await queue_human_ai(file, sliders, sliceSize, sliceStride, variant, points)
+    return await run_in_threadpool(respond, request, await job_result(job))
+
+
+@app.post("/jobs/HumanAi", status_code=202)
+async def submit_human_job(
+    file: UploadFile = File(...),
+    sliders: str = Form(...),
+    sliceSize: int = Form(32000),
+    sliceStride: Optional[int] = Form(None),
+    variant: Optional[str] = Form(None),
+    points: Optional[int] = Form(None, gt=0),
+):
+    job = await queue_human_ai(file, sliders, sliceSize, sliceStride, variant, points)
+    return job.status()
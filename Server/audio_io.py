@@ -0,0 +1,153 @@
+# server/audio_io.py
+# Block-by-block audio I/O, so a large upload or result never needs more
+# than one full-size copy in memory:
+#
+#   spool_upload  copies a multipart upload to a temp file in chunks while
+#                 hashing it (the hash is the stem cache's content key)
+#   read_audio    decodes a file with soundfile block by block into one
+#                 preallocated [channels, time] buffer, memory-mapped from a
+#                 temp file above a size threshold
+#   WavWriter     writes 16-bit PCM incrementally and renames into place
+#                 when done, so readers never see a half-written file
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+CHUNK_BYTES = 1 << 20
+BLOCK_FRAMES = 1 << 16
+
+
+class Upload:
+    """A spooled upload on disk: path, sha256 hex digest and size in bytes."""
+
+    def __init__(self, path, sha256, size):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_upload(file, directory=None, chunk_bytes=CHUNK_BYTES):
+    """Copy a FastAPI UploadFile to a temp file chunk by chunk; returns Upload.
+
+    The caller owns the file and must discard() it.
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(chunk_bytes):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return Upload(path, digest.hexdigest(), size)
+
+
+def allocate(shape, dtype, mmap_bytes=None):
+    """Zeroed array, backed by an anonymous temp file if larger than mmap_bytes."""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if mmap_bytes is None or nbytes <= mmap_bytes:
+        return np.zeros(shape, dtype)
+    # TemporaryFile is deleted on close; the mapping keeps its own handle
+    with tempfile.TemporaryFile(prefix="audio-") as backing:
+        return np.memmap(backing, dtype=dtype, mode="w+", shape=shape)
+
+
+def read_audio(path, stereo=False, normalize=False, mmap_bytes=None, block_frames=BLOCK_FRAMES):
+    """Decode a sound file into [channels, time] float32, block by block.
+
+    stereo duplicates a mono file to two channels; normalize scales the peak
+    to 1 in place.
+    """
+    import soundfile as sf
+
+    with sf.SoundFile(path) as f:
+        fs = f.samplerate
+        channels = 2 if stereo and f.channels == 1 else f.channels
+        if not f.seekable() or f.frames <= 0:
+            # Length unknown up front: decode in one go
+            data = f.read(dtype="float32", always_2d=True)
+            audio = allocate((channels, len(data)), np.float32, mmap_bytes)
+            audio[...] = data.T
+        else:
+            audio = allocate((channels, f.frames), np.float32, mmap_bytes)
+            block = np.empty((block_frames, f.channels), dtype=np.float32)
+            start = 0
+            while start < f.frames:
+                got = f.read(min(block_frames, f.frames - start), dtype="float32", out=block)
+                if len(got) == 0:
+                    break
+                audio[:, start : start + len(got)] = got.T
+                start += len(got)
+            audio = audio[:, :start]
+
+    if normalize:
+        peak = 0.0
+        for start in range(0, audio.shape[-1], block_frames):
+            peak = max(peak, float(np.abs(audio[:, start : start + block_frames]).max(initial=0.0)))
+        if peak > 0:
+            audio /= peak
+    return audio, fs
+
+
+class WavWriter:
+    """Incremental 16-bit PCM WAV writer: write() float blocks in [-1, 1].
+
+    Samples are clipped and scaled by 32767 as scipy's writer was fed before.
+    The file appears at `path` only once close() succeeds.
+    """
+
+    def __init__(self, path, fs, channels=1):
+        import soundfile as sf
+
+        self.path = path
+        self._partial = path + ".part"
+        self._file = sf.SoundFile(
+            self._partial, "w", samplerate=int(fs), channels=channels, format="WAV", subtype="PCM_16"
+        )
+        self.frames = 0
+
+    def write(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        pcm = (np.clip(block, -1, 1) * 32767).astype(np.int16)
+        self._file.write(pcm)
+        self.frames += len(pcm)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._partial, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_wav(path, fs, samples, block_frames=BLOCK_FRAMES):
+    """Write a (time,) or (time, channels) float array block by block."""
+    samples = np.asarray(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    with WavWriter(path, fs, channels) as writer:
+        for start in range(0, len(samples), block_frames):
+            writer.write(samples[start : start + block_frames])
+    return writer.frames
@@ -0,0 +1,426 @@
+# server/bench_endpoints.py
+# Reproducible benchmark of every endpoint the client calls, on synthetic
+# signals (tones plus seeded noise) of growing length, mono and stereo, with
+# slider sets of growing size:
+#
+#   /calculatefft /applyEqualizer /spectrogram /saveEQ   JSON or binary (wire.py) bodies
+#   /MusicAi /HumanAi                                     multipart WAV uploads
+#
+# Every case is sent byte for byte the same in-process (FastAPI TestClient,
+# no sockets) and over HTTP to a local uvicorn. Per case the report has the
+# wall time of each run, request / response bytes and the peak RSS of the
+# process serving it (reset per case through /proc/<pid>/clear_refs on Linux).
+# The whole run is one JSON document; --compare checks it against a baseline
+# and exits non-zero on regressions:
+#
+#   python bench_endpoints.py --out base.json
+#   python bench_endpoints.py --out new.json --compare base.json
+#   python bench_endpoints.py --compare base.json new.json      # no run
+#   python bench_endpoints.py --durations 1 60 1800 --formats binary --endpoints /spectrogram
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from bench_parity import Client, free_port, wait_ready
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DSP_ENDPOINTS = ("/calculatefft", "/applyEqualizer", "/spectrogram", "/saveEQ")
+AI_ENDPOINTS = ("/MusicAi", "/HumanAi")
+ENDPOINTS = DSP_ENDPOINTS + AI_ENDPOINTS
+SLIDER_ENDPOINTS = ("/applyEqualizer", "/MusicAi", "/HumanAi")
+FORMATS = ("json", "binary")
+MODES = ("inprocess", "http")
+MUSIC_SLIDERS = ("drums", "vocals", "violin", "bass_guitar")
+BOUNDARY = "harmonix-bench-boundary"
+BLOCK = 1 << 18
+
+
+# ---------- payloads ----------
+def signal(seconds, channels=1, fs=44100, seed=0):
+    """(time,) or (time, channels) float32 tones plus noise, deterministic per arguments."""
+    n = int(round(seconds * fs))
+    rng = np.random.default_rng(seed)
+    out = np.empty((n, channels), dtype=np.float32)
+    for start in range(0, n, BLOCK):
+        t = np.arange(start, min(n, start + BLOCK)) / fs
+        for c in range(channels):
+            tone = 0.5 * np.sin(2 * np.pi * 440 * (c + 1) * t) + 0.25 * np.sin(2 * np.pi * 3000 * t)
+            out[start : start + len(t), c] = tone + 0.05 * rng.standard_normal(len(t))
+    return out[:, 0] if channels == 1 else out
+
+
+def eq_sliders(count):
+    """count adjacent bands, log-spaced over 20 Hz .. 20 kHz."""
+    edges = np.geomspace(20, 20000, count + 1)
+    return [
+        {"low": float(edges[i]), "high": float(edges[i + 1]), "value": (1.5, 0.5, 0.0)[i % 3]}
+        for i in range(count)
+    ]
+
+
+def ai_sliders(endpoint, count):
+    if endpoint == "/MusicAi":
+        names = [MUSIC_SLIDERS[i % len(MUSIC_SLIDERS)] for i in range(count)]
+    else:
+        names = [f"source_{i + 1}" for i in range(count)]
+    return [{"name": name, "value": 1.0 - 0.1 * (i % 5)} for i, name in enumerate(names)]
+
+
+def wav_bytes(samples, fs):
+    import soundfile as sf
+
+    out = io.BytesIO()
+    sf.write(out, samples, fs, format="WAV", subtype="PCM_16")
+    return out.getvalue()
+
+
+def multipart(fields, filename, data):
+    """multipart/form-data body with a fixed boundary (same bytes every run)."""
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: audio/wav\r\n\r\n".encode() + data + b"\r\n"
+    )
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def build_request(case, fs):
+    """(body, content type, accept) for a case."""
+    import wire
+
+    endpoint = case["endpoint"]
+    samples = signal(case["audioSeconds"], case["channels"], fs)
+    if endpoint in AI_ENDPOINTS:
+        fields = {"sliders": json.dumps(ai_sliders(endpoint, case["sliders"]))}
+        body, content_type = multipart(fields, "signal.wav", wav_bytes(samples, fs))
+        return body, content_type, None
+
+    scalars = {"sampleRate": int(fs), "mode": "bench"} if endpoint == "/saveEQ" else {"fs": float(fs)}
+    if endpoint == "/applyEqualizer":
+        scalars["sliders"] = eq_sliders(case["sliders"])
+    if case["format"] == "binary":
+        return wire.encode({"samples": samples}, scalars), wire.FRAMED, wire.FRAMED
+    return json.dumps({"samples": samples.tolist(), **scalars}).encode(), "application/json", None
+
+
+def cases(args):
+    """Every (endpoint, duration, channels, sliders, format) case, with a skip reason or None."""
+    for endpoint in args.endpoints:
+        ai = endpoint in AI_ENDPOINTS
+        # The DSP endpoints take one channel of samples; uploads may be stereo
+        channel_sets = args.channels if ai else [1]
+        slider_sets = args.sliders if endpoint in SLIDER_ENDPOINTS else [0]
+        formats = ["multipart"] if ai else args.formats
+        for seconds in args.durations:
+            for channels in channel_sets:
+                for sliders in slider_sets:
+                    for fmt in formats:
+                        case = {"endpoint": endpoint, "audioSeconds": seconds, "channels": channels,
+                                "sliders": sliders, "format": fmt}
+                        case["id"] = f"{endpoint} {seconds:g}s {channels}ch {sliders}sl {fmt}"
+                        skip = None
+                        if ai and seconds > args.ai_max_seconds:
+                            skip = "longer than --ai-max-seconds"
+                        elif fmt == "json" and seconds > args.max_json_seconds:
+                            skip = "longer than --max-json-seconds"
+                        yield case, skip
+
+
+# ---------- memory ----------
+def reset_peak_rss(pid):
+    """Reset the kernel's peak RSS (VmHWM) of pid; False where unsupported."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def rss(pid):
+    """(current, peak) resident set size of pid in bytes, from /proc."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+# ---------- runners ----------
+class InProcess:
+    """Requests through the ASGI app in this process."""
+
+    name = "inprocess"
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+
+        import ServerPy
+
+        self.dsp_only = ServerPy.DSP_ONLY
+        self.pid = os.getpid()
+        self.client = TestClient(ServerPy.app)
+        self.client.__enter__()  # runs the startup handlers
+
+    def post(self, path, body, content_type, accept=None):
+        headers = {"Content-Type": content_type}
+        if accept:
+            headers["Accept"] = accept
+        response = self.client.post(path, content=body, headers=headers)
+        return response.status_code, response.content
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+
+
+class Http:
+    """Requests over a socket to a uvicorn started here (or already running at url)."""
+
+    name = "http"
+
+    def __init__(self, workdir, url=None):
+        self.process = None
+        self.pid = None
+        if url is None:
+            url = f"http://127.0.0.1:{free_port()}"
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "ServerPy:app", "--app-dir", HERE,
+                 "--port", str(urlsplit(url).port), "--log-level", "warning"],
+                cwd=workdir,
+            )
+            self.pid = self.process.pid
+        self.url = url
+        try:
+            wait_ready(url, self.process)
+        except BaseException:
+            self.close()
+            raise
+        self.client = Client(url)
+        self.dsp_only = self.ready().get("mode") == "dsp-only"
+
+    def ready(self):
+        parts = urlsplit(self.url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        try:
+            conn.request("GET", "/ready")
+            return json.loads(conn.getresponse().read())
+        finally:
+            conn.close()
+
+    def post(self, path, body, content_type, accept=None):
+        return self.client.post(path, body, content_type, accept)
+
+    def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+# ---------- measurement ----------
+def measure(runner, case, request, repeat):
+    body, content_type, accept = request
+    scoped = runner.pid is not None and reset_peak_rss(runner.pid)
+    base, _ = rss(runner.pid) if runner.pid is not None else (None, None)
+    runs, status, response_bytes, error = [], None, None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            status, data = runner.post(case["endpoint"], body, content_type, accept)
+        except OSError as e:
+            status, data, error = None, b"", str(e)
+        runs.append(time.perf_counter() - start)
+        response_bytes = len(data)
+        if status != 200:
+            error = error or data[:300].decode(errors="replace")
+            break
+        del data
+    _, peak = rss(runner.pid) if runner.pid is not None else (None, None)
+
+    result = {**case, "mode": runner.name, "status": status,
+              "requestBytes": len(body), "responseBytes": response_bytes,
+              "runs": [round(r, 6) for r in runs],
+              "wallSeconds": {
+                  "first": round(runs[0], 6),
+                  "min": round(min(runs), 6),
+                  "median": round(float(np.median(runs)), 6),
+                  "max": round(max(runs), 6),
+              },
+              # "case": peak since this case started; "process": since the server started
+              "rssScope": ("case" if scoped else "process") if peak is not None else None,
+              "baseRssBytes": base, "peakRssBytes": peak}
+    if error:
+        result["error"] = error
+    return result
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith("HARMONIX_")},
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+
+
+def run(args):
+    # /saveEQ writes to ../client/public and /HumanAi to the working directory
+    workdir = os.path.join(tempfile.mkdtemp(prefix="harmonix-bench-"), "work")
+    os.makedirs(workdir)
+    if args.dsp_only:
+        os.environ["HARMONIX_DSP_ONLY"] = "1"
+    sys.path.insert(0, HERE)
+    os.chdir(workdir)
+
+    runners = []
+    try:
+        for mode in args.modes:
+            runners.append(InProcess() if mode == "inprocess" else Http(workdir, args.url))
+
+        results = []
+        for case, skip in cases(args):
+            if skip is None and case["endpoint"] in AI_ENDPOINTS and all(r.dsp_only for r in runners):
+                skip = "AI endpoints disabled (HARMONIX_DSP_ONLY)"
+            if skip is not None:
+                results.append({**case, "skipped": skip})
+                continue
+            request = build_request(case, args.sample_rate)
+            for runner in runners:
+                if case["endpoint"] in AI_ENDPOINTS and runner.dsp_only:
+                    results.append({**case, "mode": runner.name, "skipped": "AI endpoints disabled"})
+                    continue
+                result = measure(runner, case, request, args.repeat)
+                results.append(result)
+                print(f"{runner.name:9} {case['id']:48} {result['wallSeconds']['median']:9.4f}s "
+                      f"status {result['status']}", file=sys.stderr, flush=True)
+            del request
+        return {"environment": environment(args), "results": results}
+    finally:
+        for runner in runners:
+            runner.close()
+
+
+# ---------- compare ----------
+def compare(baseline, current, threshold, min_seconds):
+    """One report per case in both runs; a case regresses if its median wall
+    time (by more than min_seconds) or peak RSS grew by more than threshold×,
+    or its response size changed."""
+    def index(report):
+        return {(r.get("mode"), r["id"]): r for r in report["results"]
+                if "skipped" not in r and r.get("status") == 200}
+
+    before, after = index(baseline), index(current)
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        old_wall, new_wall = old["wallSeconds"]["median"], new["wallSeconds"]["median"]
+        report = {"kind": "compare", "mode": key[0], "id": key[1],
+                  "wallBefore": old_wall, "wallAfter": new_wall,
+                  "wallRatio": round(new_wall / old_wall, 3) if old_wall else None,
+                  "rssBefore": old.get("peakRssBytes"), "rssAfter": new.get("peakRssBytes"),
+                  "responseBytesBefore": old["responseBytes"], "responseBytesAfter": new["responseBytes"]}
+        reasons = []
+        if old_wall and new_wall > old_wall * threshold and new_wall - old_wall > min_seconds:
+            reasons.append("wall")
+        if (old.get("rssScope") == new.get("rssScope") == "case"
+                and new["peakRssBytes"] > old["peakRssBytes"] * threshold):
+            reasons.append("rss")
+        if old["responseBytes"] != new["responseBytes"]:
+            reasons.append("responseBytes")
+        report["regression"] = reasons
+        regressions += bool(reasons)
+        yield report
+    yield {"kind": "summary", "compared": len(before.keys() & after.keys()), "regressions": regressions,
+           "onlyBaseline": sorted(" ".join(map(str, k)) for k in before.keys() - after.keys()),
+           "onlyCurrent": sorted(" ".join(map(str, k)) for k in after.keys() - before.keys())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Wall time, peak RSS and payload sizes of every endpoint on synthetic signals."
+    )
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--url", help="benchmark a running server in http mode instead of starting one")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--durations", nargs="+", type=float, default=[1, 10, 60, 300],
+                        help="signal lengths in seconds (30 min is 1800)")
+    parser.add_argument("--channels", nargs="+", type=int, default=[1, 2], choices=[1, 2],
+                        help="upload channels for /MusicAi and /HumanAi")
+    parser.add_argument("--sliders", nargs="+", type=int, default=[1, 8, 32],
+                        help="slider set sizes for /applyEqualizer, /MusicAi and /HumanAi")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case")
+    parser.add_argument("--max-json-seconds", type=float, default=300,
+                        help="skip JSON bodies for longer signals (they take GBs to encode)")
+    parser.add_argument("--ai-max-seconds", type=float, default=60)
+    parser.add_argument("--dsp-only", action="store_true", help="run with HARMONIX_DSP_ONLY=1")
+    parser.add_argument("--out", help="write the report here (default: stdout)")
+    parser.add_argument("--compare", nargs="+", metavar=("BASELINE", "CURRENT"),
+                        help="compare this run (or CURRENT, without running) to BASELINE")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="regression when wall time or peak RSS grows by more than this factor")
+    parser.add_argument("--min-seconds", type=float, default=0.005,
+                        help="ignore wall time differences smaller than this")
+    args = parser.parse_args(argv)
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes BASELINE and optionally CURRENT")
+
+    out = os.path.abspath(args.out) if args.out else None
+    paths = [os.path.abspath(p) for p in args.compare or []]
+    if len(paths) == 2:
+        with open(paths[1]) as f:
+            report = json.load(f)
+    else:
+        report = run(args)
+        text = json.dumps(report, indent=1)
+        if out:
+            with open(out, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+
+    if paths:
+        with open(paths[0]) as f:
+            baseline = json.load(f)
+        # Keep stdout parseable when the report itself went there
+        stream = sys.stderr if len(paths) < 2 and not out else sys.stdout
+        regressions = 0
+        for line in compare(baseline, report, args.threshold, args.min_seconds):
+            print(json.dumps(line), file=stream)
+            if line["kind"] == "summary":
+                regressions = line["regressions"]
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
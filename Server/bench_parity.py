@@ -0,0 +1,274 @@
+# server/bench_parity.py
+# Benchmark and parity check of the DSP backends the client can talk to:
+# this FastAPI server (port 8000 in the client) and Cppserver.cpp (8080).
+# Both get byte-identical JSON payloads for /calculatefft, /applyEqualizer
+# and /spectrogram; the report has
+#
+#   parity   per endpoint / size: shapes and max abs / relative differences
+#            of every returned array against the reference backend
+#   load     per endpoint / size / concurrency: latency p50 / p90 / p99 and
+#            throughput
+#
+# as one JSON object per line. Servers are started as local processes (or
+# given by URL). The Python server runs with HARMONIX_FFT_SIZING=pow2 so both
+# use the same FFT length, once per --kernels choice:
+#
+#   python bench_parity.py --build-cpp --kernels numpy numba
+#   python bench_parity.py --python-url http://127.0.0.1:8000 --cpp-url http://127.0.0.1:8080
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CPP_SOURCE = os.path.join(HERE, "Cppserver.cpp")
+CPP_PORT = 8080  # hard-coded in Cppserver.cpp
+ENDPOINTS = ("/calculatefft", "/applyEqualizer", "/spectrogram")
+SLIDERS = [
+    {"low": 20, "high": 250, "value": 1.5},
+    {"low": 250, "high": 2000, "value": 0.5},
+    {"low": 4000, "high": 12000, "value": 0.0},
+]
+
+
+# ---------- payloads ----------
+def test_signal(n, fs=44100.0, seed=0):
+    """Tones plus noise, deterministic per (n, seed)."""
+    t = np.arange(n) / fs
+    rng = np.random.default_rng(seed)
+    signal = 0.5 * np.sin(2 * np.pi * 440 * t) + 0.25 * np.sin(2 * np.pi * 3000 * t)
+    return signal + 0.05 * rng.standard_normal(n)
+
+
+def payload(endpoint, n, fs=44100.0):
+    body = {"samples": test_signal(n, fs).tolist(), "fs": fs}
+    if endpoint == "/applyEqualizer":
+        body["sliders"] = SLIDERS
+    return json.dumps(body).encode()
+
+
+# ---------- servers ----------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_cpp(output):
+    compiler = os.environ.get("CXX", "c++")
+    subprocess.run(
+        [compiler, "-O2", "-std=c++17", "-pthread", CPP_SOURCE, "-o", output], check=True, cwd=HERE
+    )
+    return output
+
+
+def start_python(port, kernels):
+    env = dict(
+        os.environ,
+        HARMONIX_DSP_ONLY="1",
+        HARMONIX_FFT_SIZING="pow2",
+        HARMONIX_DSP_KERNELS=kernels,
+        HARMONIX_DSP_TRACE_MEMORY="0",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ServerPy:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env,
+    )
+
+
+def wait_ready(url, process=None, timeout=120):
+    body = payload("/calculatefft", 256)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server for {url} exited with code {process.returncode}")
+        try:
+            status, _ = Client(url).post("/calculatefft", body)
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} did not become ready")
+
+
+class Client:
+    """Keep-alive POSTs to one server (one connection per thread)."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def post(self, path, body, content_type="application/json", accept=None):
+        headers = {"Content-Type": content_type}
+        if accept:
+            headers["Accept"] = accept
+        conn = getattr(self._local, "conn", None)
+        # A reused connection may have been closed by the server's keep-alive timeout
+        for retry in (conn is not None, False):
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=600)
+            try:
+                conn.request("POST", path, body, headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = self._local.conn = None
+                if not retry:
+                    raise
+
+
+# ---------- parity ----------
+def compare(reference, other):
+    """Shapes and max abs / relative differences of the arrays both returned."""
+    result = {}
+    for key, ref in reference.items():
+        if key not in other or not isinstance(ref, list):
+            continue
+        a, b = np.asarray(ref, dtype=float), np.asarray(other[key], dtype=float)
+        entry = {"shape": list(a.shape), "otherShape": list(b.shape)}
+        if a.ndim == b.ndim and a.size and b.size:
+            common = tuple(slice(0, min(x, y)) for x, y in zip(a.shape, b.shape))
+            diff = np.abs(a[common] - b[common])
+            scale = np.abs(a[common]).max()
+            entry["maxAbs"] = float(diff.max())
+            entry["maxRel"] = float(diff.max() / scale) if scale > 0 else None
+        result[key] = entry
+    return result
+
+
+def parity(backends, sizes, endpoints):
+    reference = backends[0]
+    for endpoint in endpoints:
+        for n in sizes:
+            body = payload(endpoint, n)
+            responses = {}
+            for name, client in backends:
+                status, data = client.post(endpoint, body)
+                responses[name] = json.loads(data) if status == 200 else None
+            ref = responses[reference[0]]
+            for name, _ in backends[1:]:
+                report = {"kind": "parity", "endpoint": endpoint, "n": n,
+                          "reference": reference[0], "backend": name}
+                if ref is None or responses[name] is None:
+                    report["error"] = "request failed"
+                else:
+                    report["arrays"] = compare(ref, responses[name])
+                yield report
+
+
+# ---------- load ----------
+def load(client, endpoint, body, concurrency, requests):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            status, _ = client.post(endpoint, body)
+        except OSError:
+            status = None
+        elapsed = time.perf_counter() - start
+        with lock:
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    ms = np.percentile(latencies, [50, 90, 99]) * 1000 if latencies else [None] * 3
+    return {
+        "p50Ms": None if ms[0] is None else round(float(ms[0]), 2),
+        "p90Ms": None if ms[1] is None else round(float(ms[1]), 2),
+        "p99Ms": None if ms[2] is None else round(float(ms[2]), 2),
+        "throughput": round(len(latencies) / wall, 2),
+        "errors": errors,
+    }
+
+
+def benchmark(backends, sizes, endpoints, concurrency, requests, warmup=2):
+    for endpoint in endpoints:
+        for n in sizes:
+            body = payload(endpoint, n)
+            for name, client in backends:
+                for _ in range(warmup):
+                    client.post(endpoint, body)
+                for level in concurrency:
+                    stats = load(client, endpoint, body, level, requests)
+                    yield {"kind": "load", "endpoint": endpoint, "n": n, "backend": name,
+                           "concurrency": level, "requests": requests, **stats}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Latency, throughput and numerical parity of the Python and C++ DSP servers."
+    )
+    parser.add_argument("--cpp-url", help="use a running C++ server instead of starting one")
+    parser.add_argument("--cpp-binary", help="start this Cppserver build (listens on 8080)")
+    parser.add_argument("--build-cpp", action="store_true", help="compile Cppserver.cpp first")
+    parser.add_argument("--python-url", help="use a running Python server instead of starting one")
+    parser.add_argument("--kernels", nargs="+", default=["numpy"], choices=["numpy", "numba"],
+                        help="start one Python server per HARMONIX_DSP_KERNELS value")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[4096, 65536, 524288])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--requests", type=int, default=20, help="requests per concurrency level")
+    parser.add_argument("--skip-load", action="store_true", help="parity only")
+    args = parser.parse_args(argv)
+
+    processes, backends = [], []
+    try:
+        cpp_binary = args.cpp_binary
+        if args.build_cpp:
+            cpp_binary = build_cpp(os.path.join(tempfile.mkdtemp(prefix="harmonix-cpp-"), "cppserver"))
+        if args.cpp_url or cpp_binary:
+            url = args.cpp_url or f"http://127.0.0.1:{CPP_PORT}"
+            process = None
+            if not args.cpp_url:
+                process = subprocess.Popen([cpp_binary], stdout=subprocess.DEVNULL)
+                processes.append(process)
+            wait_ready(url, process)
+            backends.append(("cpp", Client(url)))
+
+        if args.python_url:
+            wait_ready(args.python_url)
+            backends.append(("python", Client(args.python_url)))
+        else:
+            for kernels in args.kernels:
+                url = f"http://127.0.0.1:{free_port()}"
+                process = start_python(urlsplit(url).port, kernels)
+                processes.append(process)
+                wait_ready(url, process)
+                backends.append((f"python-{kernels}", Client(url)))
+
+        if len(backends) > 1:
+            for report in parity(backends, args.sizes, args.endpoints):
+                print(json.dumps(report), flush=True)
+        if not args.skip_load:
+            for report in benchmark(backends, args.sizes, args.endpoints,
+                                    args.concurrency, args.requests):
+                print(json.dumps(report), flush=True)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+# server/dsp.py
+# Shared FFT / equalizer helpers used by the DSP endpoints and sessions.
+import threading
+from functools import lru_cache
+
+import numpy as np
+from scipy import fft as sp_fft
+
+import dsp_kernels
+
+# Working precision of the FFT / EQ / STFT paths. scipy.fft keeps float32
+# input in float32 / complex64, halving memory and bandwidth for audio.
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+
+
+def real_dtype(precision):
+    return np.dtype(PRECISIONS[precision or "float64"])
+
+
+def next_power_of_2(n):
+    return 1 << (n - 1).bit_length()
+
+
+# Transform length for an n-sample signal:
+#   pow2   next power of two (what the C++ server does)
+#   fast   next 5-smooth length (scipy.fft.next_fast_len), at most ~7% padding
+#   exact  no padding at all
+FFT_SIZINGS = ("pow2", "fast", "exact")
+
+
+@lru_cache(maxsize=256)
+def fft_size(n, sizing="pow2"):
+    # Empty input still gets a 1-point FFT (next_fast_len(0) is 0)
+    n = max(n, 1)
+    if sizing == "fast":
+        return sp_fft.next_fast_len(n, real=True)
+    if sizing == "exact":
+        return n
+    if sizing == "pow2":
+        return next_power_of_2(n)
+    raise ValueError(f"Unknown FFT sizing: {sizing}")
+
+
+def padded_rfft(samples, sizing="pow2"):
+    """Zero-pad to fft_size(len, sizing) and return (rfft spectrum, n).
+
+    The spectrum is complex64 for float32 samples, complex128 otherwise.
+    pocketfft caches plans, so repeated lengths reuse their twiddles.
+    """
+    n = fft_size(len(samples), sizing)
+    return sp_fft.rfft(samples, n), n
+
+
+def rfft_freqs(n, fs):
+    """Frequency grid of an n-point rfft.
+
+    Not cached: it is as long as the spectrum, and a module-level cache would
+    sit outside the session byte budget. band_bins caches what it needs.
+    """
+    return np.fft.rfftfreq(n, 1 / fs)
+
+
+def slider_bands(sliders):
+    """Hashable (low, high, value) tuples for a list of EQ sliders."""
+    return tuple((float(b.low), float(b.high), float(b.value)) for b in sliders)
+
+
+@lru_cache(maxsize=256)
+def band_bins(n, fs, edges):
+    """Map each (low, high) edge pair to the [start, stop) rfft bins it covers.
+
+    Matches the inclusive `low <= f <= high` masks, but uses searchsorted on
+    the sorted grid instead of comparing every bin for every band.
+    """
+    freqs = rfft_freqs(n, fs)
+    lows = np.array([low for low, _ in edges], dtype=float)
+    highs = np.array([high for _, high in edges], dtype=float)
+    starts = np.searchsorted(freqs, lows, side="left")
+    stops = np.searchsorted(freqs, highs, side="right")
+    return tuple(zip(starts.tolist(), stops.tolist()))
+
+
+def gain_curve(n, fs, bands, dtype=np.float64):
+    """Per-bin gain vector for an n-point rfft; overlapping bands multiply.
+
+    Built per call: slider values change on every drag, so caching full-length
+    curves by value would only pin memory. The bin ranges come from band_bins.
+    """
+    gain = np.ones(n // 2 + 1, dtype=dtype)
+    edges = tuple((low, high) for low, high, _ in bands)
+    for (start, stop), (_, _, value) in zip(band_bins(n, fs, edges), bands):
+        if start < stop:
+            gain[start:stop] *= value
+    return gain
+
+
+def equalize(spectrum, n, n_original, fs, bands, overwrite=False, gain=None):
+    """Apply slider gains to an rfft spectrum; return (samples, shaped spectrum).
+
+    Runs in the spectrum's precision. With overwrite the gains are applied in
+    place, for callers that own a freshly computed spectrum. gain, if given,
+    is the gain_curve of bands.
+    """
+    if gain is None:
+        gain = gain_curve(n, fs, bands, spectrum.real.dtype)
+    shaped = dsp_kernels.apply_gain(spectrum, gain, out=spectrum if overwrite else None)
+    output = sp_fft.irfft(shaped, n)[:n_original]
+    return output, shaped
+
+
+# ---------- remix spectra ----------
+# The FFT is linear: the spectrum of a gain-weighted sum of separated sources
+# is the same weighted sum of their spectra, so each source's rfft is
+# computed once and a remix only costs a few vector multiply-adds.
+def source_spectra(sources):
+    """rfft of each source's mono signal: [source, (channel,) time] -> [source, bins] complex64."""
+    n = sources.shape[-1]
+    spectra = np.empty((sources.shape[0], n // 2 + 1), dtype=np.complex64)
+    for i, source in enumerate(sources):
+        mono = source.mean(axis=0, dtype=np.float32) if source.ndim == 2 else np.asarray(source, np.float32)
+        spectra[i] = sp_fft.rfft(mono)
+    return spectra
+
+
+def mix_spectrum(spectra, gains):
+    """Spectrum of sum(gains[i] * source i), from source_spectra()."""
+    spectrum = np.zeros(spectra.shape[1], dtype=spectra.dtype)
+    for i in np.flatnonzero(gains):
+        spectrum += float(gains[i]) * spectra[i]
+    return spectrum
+
+
+# ---------- incremental EQ ----------
+# A one-slider change only alters bins inside that band, so the output moves
+# by a band-limited signal. That delta is synthesized on a coarse grid (one
+# small IFFT) and interpolated to full rate with a polyphase windowed-sinc,
+# which is much cheaper than a full-length irfft for narrow bands.
+BAND_OVERSAMPLE = 4
+INTERP_TAPS = 16
+INTERP_BETA = 9.0
+MIN_PHASES = 16  # below this the coarse grid saves too little; use irfft
+
+
+@lru_cache(maxsize=64)
+def coarse_length(n, minimum):
+    """Smallest 5-smooth divisor of n that is >= minimum, or None."""
+    m = sp_fft.next_fast_len(minimum, real=True)
+    while m <= n // MIN_PHASES:
+        if n % m == 0:
+            return m
+        m = sp_fft.next_fast_len(m + 1, real=True)
+    return None
+
+
+@lru_cache(maxsize=16)
+def polyphase_taps(phases, taps=INTERP_TAPS, beta=INTERP_BETA):
+    """Kaiser-windowed sinc interpolator: ([phases, taps] weights, sample offsets)."""
+    offsets = np.arange(taps) - (taps // 2 - 1)
+    t = np.arange(phases)[:, None] / phases - offsets[None, :]
+    window = np.i0(beta * np.sqrt(np.clip(1 - (2 * t / taps) ** 2, 0, None))) / np.i0(beta)
+    weights = np.sinc(t) * window
+    weights.flags.writeable = False
+    return weights, offsets
+
+
+def band_signal(bins, start, n):
+    """Real n-point signal whose rfft is `bins` at [start, start + len) and zero elsewhere.
+
+    Returns None when the band is too wide for the coarse grid to pay off.
+    Accuracy is about 1e-5 relative to the band signal's own peak. Runs in
+    the precision of `bins` (complex64 -> float32 output).
+    """
+    width = len(bins)
+    # The coarse grid has to tile the n-point period exactly
+    m = coarse_length(n, BAND_OVERSAMPLE * width)
+    if m is None:
+        return None
+    phases = n // m
+    k = np.arange(start, start + width)
+    # DC and (for even n) Nyquist appear once in the real signal, the rest twice
+    single = (k == 0) | ((k == n // 2) & (n % 2 == 0))
+    coef = bins * np.where(single, 1.0, 2.0) / n
+
+    # u[q] = sum_k coef_k exp(2j*pi*k*q/m): the band on the coarse grid, aliased to k mod m
+    coarse = np.zeros(m, dtype=np.result_type(bins.dtype, np.complex64))
+    coarse[k % m] = coef
+    u = sp_fft.ifft(coarse, overwrite_x=True) * m
+
+    # Demodulate about the band centre inside the taps, so they interpolate a
+    # smooth baseband signal: out[q*phases + r] = Re(sum_j u[q + j] * taps[r, j])
+    weights, offsets = polyphase_taps(phases)
+    centre = start + width // 2
+    r = np.arange(phases)[:, None]
+    taps = weights * np.exp(2j * np.pi * (centre * r / n - centre * offsets[None, :] / m))
+    taps = taps.astype(u.dtype, copy=False)
+    padded = np.concatenate([u[m + offsets[0]:], u, u[: offsets[-1]]])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, len(offsets))
+    out = np.concatenate([windows.real, windows.imag], axis=1) @ np.concatenate(
+        [taps.real, -taps.imag], axis=1
+    ).T
+    return out.reshape(-1)
+
+
+class IncrementalEq:
+    """Last EQ result for one signal, updated band by band when sliders move.
+
+    A change in slider values only (same band edges) adds each changed band's
+    delta signal to the previous output. Every `full_every` incremental
+    updates, or when the band layout changes, everything is recomputed
+    exactly so approximation error can't accumulate.
+    """
+
+    def __init__(self, spectrum, n, n_original, fs, full_every=32):
+        self.spectrum = spectrum
+        self.n = n
+        self.n_original = n_original
+        self.fs = fs
+        self.full_every = full_every
+        self.bands = None
+        self.gain = None
+        self.shaped = None
+        self.output = None
+        self.magnitudes = None
+        self.updates = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        arrays = (self.gain, self.shaped, self.output, self.magnitudes)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def apply(self, bands):
+        """Return (samples, |shaped spectrum|, mode): "full", "incremental" or "unchanged"."""
+        with self._lock:
+            mode = self._update(bands)
+            # Copies: the next slider move mutates these in place
+            return self.output.copy(), self.magnitudes.copy(), mode
+
+    def _update(self, bands):
+        edges = tuple((low, high) for low, high, _ in bands)
+        if (
+            self.bands is None
+            or edges != tuple((low, high) for low, high, _ in self.bands)
+            or self.updates >= self.full_every
+        ):
+            return self._full(bands)
+
+        ranges = band_bins(self.n, self.fs, edges)
+        changed = [
+            ranges[i] for i, (old, new) in enumerate(zip(self.bands, bands)) if old[2] != new[2]
+        ]
+        if not changed:
+            return "unchanged"
+        # Merge overlapping changed ranges; overlapping bands multiply, so the
+        # gain inside a range is rebuilt from every band
+        merged = []
+        for lo, hi in sorted(r for r in changed if r[0] < r[1]):
+            if merged and lo <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        # Wide bands have no cheap coarse grid; skip the delta work altogether
+        if any(coarse_length(self.n, BAND_OVERSAMPLE * (hi - lo)) is None for lo, hi in merged):
+            return self._full(bands)
+
+        deltas = []
+        for lo, hi in merged:
+            gain = np.ones(hi - lo, dtype=self.gain.dtype)
+            for (start, stop), (_, _, value) in zip(ranges, bands):
+                start, stop = max(start, lo), min(stop, hi)
+                if start < stop:
+                    gain[start - lo : stop - lo] *= value
+            delta = band_signal(self.spectrum[lo:hi] * (gain - self.gain[lo:hi]), lo, self.n)
+            if delta is None:
+                return self._full(bands)
+            deltas.append((lo, hi, gain, delta))
+
+        for lo, hi, gain, delta in deltas:
+            self.gain[lo:hi] = gain
+            self.shaped[lo:hi] = self.spectrum[lo:hi] * gain
+            self.magnitudes[lo:hi] = np.abs(self.shaped[lo:hi])
+            self.output += delta[: self.n_original]
+        self.bands = bands
+        self.updates += 1
+        return "incremental"
+
+    def _full(self, bands):
+        self.gain = gain_curve(self.n, self.fs, bands, self.spectrum.real.dtype)
+        self.output, self.shaped = equalize(
+            self.spectrum, self.n, self.n_original, self.fs, bands, gain=self.gain
+        )
+        self.magnitudes = np.abs(self.shaped)
+        self.bands = bands
+        self.updates = 0
+        return "full"
+
+
+@lru_cache(maxsize=8)
+def sqrt_hann(block_size):
+    """Periodic sqrt-Hann; at 50% overlap analysis*synthesis sums to one."""
+    k = np.arange(block_size)
+    window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * k / block_size))
+    window.flags.writeable = False
+    return window
+
+
+def stream_equalize(samples, fs, bands, block_size=4096):
+    """Equalize block by block with weighted overlap-add, yielding output as it is ready.
+
+    Each yielded block holds `block_size // 2` samples (the last may be shorter).
+    Working memory is a few blocks regardless of the signal length. The gain
+    curve is the same as `equalize`, sampled on a block_size-point grid.
+    """
+    hop = block_size // 2
+    window = sqrt_hann(block_size)
+    gain = gain_curve(block_size, fs, bands)
+    n = len(samples)
+
+    frame = np.zeros(block_size)
+    tail = np.zeros(hop)
+    # Start one hop early so the first output samples get both overlapping frames
+    for start in range(-hop, n, hop):
+        lo, hi = max(start, 0), min(start + block_size, n)
+        frame[:] = 0.0
+        frame[lo - start : hi - start] = samples[lo:hi]
+
+        out = np.fft.irfft(np.fft.rfft(frame * window) * gain, block_size) * window
+        out[:hop] += tail
+        tail = out[hop:]
+
+        if start >= 0:
+            yield out[: min(hop, n - start)]
+
+
+@lru_cache(maxsize=16)
+def analysis_window(name, size):
+    """Symmetric analysis window; "hann" is np.hanning as before."""
+    if name == "hann":
+        window = np.hanning(size)
+    else:
+        from scipy.signal import get_window
+        window = get_window(name, size, fftbins=False)
+    window.flags.writeable = False
+    return window
+
+
+def stft_frame_count(n, window_size, hop, pad_end=True):
+    """Number of STFT frames of an n-sample signal."""
+    if pad_end and n > 0:
+        return -(-max(n - window_size, 0) // hop) + 1
+    return (n - window_size) // hop + 1 if n >= window_size else 0
+
+
+def stft_batches(samples, window_size=2048, hop_size=None, window="hann",
+                 scale="linear", dtype=np.float64, pad_end=True, batch_frames=4096,
+                 precision="float64", out=None):
+    """Yield (first frame index, [frames, freq] magnitudes) per batch, in time order.
+
+    Frames are a strided sliding-window view of the signal (no per-frame
+    copies) and each batch of frames goes through a single 2-D rfft. With
+    pad_end the trailing partial frame is zero-padded instead of dropped.
+    scale="db" returns 20*log10(magnitude). The transforms run in `precision`;
+    `dtype` is the dtype of the returned magnitudes. Batches are written into
+    `out` (all frames) when given, else into a fresh array each.
+    """
+    hop = hop_size or window_size // 4
+    work = real_dtype(precision)
+    samples = np.asarray(samples, dtype=work)
+    n = len(samples)
+    win = analysis_window(window, window_size).astype(work, copy=False)
+
+    n_full = stft_frame_count(n, window_size, hop, pad_end=False)
+    n_frames = stft_frame_count(n, window_size, hop, pad_end)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, window_size)[::hop] \
+        if n_full else np.empty((0, window_size))
+    if n_frames > n_full:
+        # Only the tail gets copied into a zero-padded buffer
+        tail_start = n_full * hop
+        tail = np.zeros((n_frames - n_full - 1) * hop + window_size, dtype=work)
+        tail[: n - tail_start] = samples[tail_start:]
+        tail_frames = np.lib.stride_tricks.sliding_window_view(tail, window_size)[::hop]
+    else:
+        tail_frames = np.empty((0, window_size))
+
+    bins = window_size // 2 + 1
+    # One windowed-frame buffer, reused (and overwritten by the rfft) per batch
+    buf = np.empty((min(batch_frames, max(n_frames, 1)), window_size), dtype=work)
+    pos = 0
+    for source in (frames, tail_frames):
+        for start in range(0, len(source), batch_frames):
+            batch = source[start : start + batch_frames]
+            block = out[pos : pos + len(batch)] if out is not None else np.empty((len(batch), bins), dtype)
+            windowed = dsp_kernels.windowed(batch, win, buf[: len(batch)])
+            spectrum = sp_fft.rfft(windowed, axis=-1, overwrite_x=True)
+            dsp_kernels.magnitudes(spectrum, block, db=scale == "db")
+            yield pos, block
+            pos += len(batch)
+
+
+def stft_magnitudes(samples, window_size=2048, hop_size=None, window="hann",
+                    scale="linear", dtype=np.float64, pad_end=True, batch_frames=4096,
+                    precision="float64"):
+    """Magnitude STFT as a [time, freq] array (see stft_batches)."""
+    hop = hop_size or window_size // 4
+    out = np.empty((stft_frame_count(len(samples), window_size, hop, pad_end), window_size // 2 + 1),
+                   dtype=dtype)
+    for _ in stft_batches(samples, window_size, hop, window, scale, dtype, pad_end,
+                          batch_frames, precision, out=out):
+        pass
+    return out
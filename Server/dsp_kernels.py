@@ -0,0 +1,126 @@
+# server/dsp_kernels.py
+# The elementwise hot loops around the FFTs (windowing frames, magnitudes /
+# dB, applying EQ gains), as plain numpy or as numba-compiled loops that run
+# in one pass, without temporaries, across all cores.
+#
+#   HARMONIX_DSP_KERNELS=numpy   (default) numpy ufuncs
+#   HARMONIX_DSP_KERNELS=numba   compiled kernels; needs `pip install numba`
+#
+# use(name) switches at runtime (per process: DSP worker processes pick the
+# environment variable up at import). Each compiled kernel is built for a
+# dtype on its first call; numba caches the machine code next to this file.
+import os
+
+import numpy as np
+
+BACKENDS = ("numpy", "numba")
+
+
+# ---------- numpy ----------
+def _numpy_windowed(frames, window, out):
+    return np.multiply(frames, window, out=out)
+
+
+def _decibels(out):
+    np.maximum(out, np.finfo(out.dtype).tiny, out=out)
+    np.log10(out, out=out)
+    out *= 20
+    return out
+
+
+def _numpy_magnitudes(spectrum, out, db=False):
+    np.abs(spectrum, out=out)
+    return _decibels(out) if db else out
+
+
+def _numpy_apply_gain(spectrum, gain, out):
+    return np.multiply(spectrum, gain, out=out)
+
+
+# ---------- numba ----------
+def _numba_kernels():
+    import numba
+
+    @numba.njit(parallel=True, cache=True)
+    def windowed(frames, window, out):
+        for i in numba.prange(frames.shape[0]):
+            for j in range(frames.shape[1]):
+                out[i, j] = frames[i, j] * window[j]
+        return out
+
+    @numba.njit(parallel=True, cache=True)
+    def magnitudes_2d(spectrum, out):
+        for i in numba.prange(spectrum.shape[0]):
+            for j in range(spectrum.shape[1]):
+                value = spectrum[i, j]
+                out[i, j] = np.sqrt(value.real * value.real + value.imag * value.imag)
+        return out
+
+    @numba.njit(parallel=True, cache=True)
+    def apply_gain_1d(spectrum, gain, out):
+        for i in numba.prange(spectrum.shape[0]):
+            out[i] = spectrum[i] * gain[i]
+        return out
+
+    def magnitudes(spectrum, out, db=False):
+        if spectrum.ndim == 1:
+            magnitudes_2d(spectrum[None], out[None])
+        else:
+            magnitudes_2d(spectrum, out)
+        if db:
+            # numpy's vectorized log10 beats a per-element libm call
+            _decibels(out)
+        return out
+
+    def apply_gain(spectrum, gain, out):
+        if spectrum.ndim != 1:
+            return _numpy_apply_gain(spectrum, gain, out)
+        return apply_gain_1d(spectrum, gain.astype(spectrum.real.dtype, copy=False), out)
+
+    return {"windowed": windowed, "magnitudes": magnitudes, "apply_gain": apply_gain}
+
+
+_NUMPY = {"windowed": _numpy_windowed, "magnitudes": _numpy_magnitudes, "apply_gain": _numpy_apply_gain}
+_impl = dict(_NUMPY)
+backend = "numpy"
+
+
+def use(name):
+    """Switch this process to the "numpy" or "numba" kernels; returns the one in use."""
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DSP kernels: {name}")
+    if name == "numba":
+        try:
+            kernels = _numba_kernels()
+        except ImportError:
+            print("HARMONIX_DSP_KERNELS=numba but numba is not installed; using numpy")
+            name, kernels = "numpy", _NUMPY
+    else:
+        kernels = _NUMPY
+    _impl.update(kernels)
+    backend = name
+    return name
+
+
+# ---------- dispatch ----------
+def windowed(frames, window, out):
+    """out[i, j] = frames[i, j] * window[j]."""
+    return _impl["windowed"](frames, window, out)
+
+
+def magnitudes(spectrum, out=None, db=False):
+    """out = |spectrum|, or 20*log10(|spectrum|) (floored at tiny) with db."""
+    if out is None:
+        out = np.empty(spectrum.shape, spectrum.real.dtype)
+    return _impl["magnitudes"](spectrum, out, db)
+
+
+def apply_gain(spectrum, gain, out=None):
+    """spectrum * gain (a real per-bin curve); out may be spectrum itself."""
+    if out is None:
+        out = np.empty_like(spectrum)
+    return _impl["apply_gain"](spectrum, gain, out)
+
+
+use(os.environ.get("HARMONIX_DSP_KERNELS", "numpy"))
@@ -0,0 +1,215 @@
+# server/dsp_pool.py
+# Runs the CPU-bound DSP kernels either inline (the request's own thread) or
+# in a pool of worker processes, so concurrent large FFTs use every core
+# instead of contending for one interpreter.
+#
+# With the process backend, input and output arrays are copied once into
+# multiprocessing.shared_memory blocks and only their names, dtypes and
+# shapes are pickled.
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from dsp import padded_rfft, equalize, stft_magnitudes
+from dsp_kernels import magnitudes
+
+
+# ---------- kernels: (arrays, **params) -> (arrays, meta) ----------
+def fft_kernel(arrays, sizing="pow2"):
+    spectrum, n = padded_rfft(arrays["samples"], sizing)
+    return {"magnitudes": magnitudes(spectrum)}, {"n": n}
+
+
+def equalize_kernel(arrays, fs, bands, n=None, n_original=None, sizing="pow2"):
+    """EQ from samples, or from a precomputed rfft (`spectrum` + n, n_original)."""
+    if "spectrum" in arrays:
+        spectrum = arrays["spectrum"]
+    else:
+        samples = arrays["samples"]
+        spectrum, n = padded_rfft(samples, sizing)
+        n_original = len(samples)
+        # Our own fresh spectrum: apply the gains in place
+        output, shaped = equalize(spectrum, n, n_original, fs, bands, overwrite=True)
+        return {"samples": output, "magnitudes": magnitudes(shaped)}, {"n": n}
+    output, shaped = equalize(spectrum, n, n_original, fs, bands)
+    return {"samples": output, "magnitudes": magnitudes(shaped)}, {"n": n}
+
+
+def spectrogram_kernel(arrays, **params):
+    return {"frames": stft_magnitudes(arrays["samples"], **params)}, {}
+
+
+KERNELS = {
+    "fft": fft_kernel,
+    "equalize": equalize_kernel,
+    "spectrogram": spectrogram_kernel,
+}
+
+
+# ---------- memory accounting ----------
+# tracemalloc sees numpy's buffers. It traces every thread of the process,
+# so in the server process it would slow down other requests' JSON parsing
+# and encoding many times over while any kernel runs. By default it only
+# runs in process-backend workers, which run one kernel at a time, so their
+# peaks are exact. HARMONIX_DSP_TRACE_MEMORY=1 also traces in the server
+# process (thread backend, incremental EQ); 0 turns it off everywhere.
+# Untraced runs report estimate_peak instead, which costs a few attribute
+# reads.
+_TRACE_SETTING = os.environ.get("HARMONIX_DSP_TRACE_MEMORY", "workers").lower()
+TRACE_MEMORY = _TRACE_SETTING in ("1", "true", "yes")
+TRACE_WORKERS = _TRACE_SETTING not in ("0", "false", "no")
+_trace_lock = threading.Lock()
+_tracing = 0
+
+
+def estimate_peak(inputs, outputs, n=None):
+    """Bytes a kernel holds at once: its inputs, its outputs and, for n, one rfft.
+
+    A lower bound on the traced peak (temporaries inside scipy / numpy are
+    not counted), cheap enough to report for every request.
+    """
+    arrays = [np.asarray(arr) for arr in (*inputs.values(), *outputs.values())]
+    total = sum(arr.nbytes for arr in arrays)
+    if n is not None and arrays:
+        # complex128 for float64 / complex128 data, complex64 for float32
+        total += (n // 2 + 1) * np.result_type(arrays[0].dtype, np.complex64).itemsize
+    return total
+
+
+def measure(fn, *args, **kwargs):
+    """Run fn and return (result, peak bytes allocated meanwhile, or None)."""
+    return _measure(TRACE_MEMORY, fn, *args, **kwargs)
+
+
+def _measure(trace, fn, *args, **kwargs):
+    global _tracing
+    if not trace:
+        return fn(*args, **kwargs), None
+    with _trace_lock:
+        if _tracing == 0:
+            tracemalloc.start()
+        _tracing += 1
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        with _trace_lock:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            _tracing -= 1
+            if _tracing == 0:
+                tracemalloc.stop()
+    return result, max(peak, 0)
+
+
+# ---------- shared memory transport ----------
+def _share(arrays):
+    """Copy arrays into new shared memory blocks; returns (blocks, descriptors)."""
+    blocks, descs = [], {}
+    for name, arr in arrays.items():
+        arr = np.asarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        descs[name] = (shm.name, arr.dtype.str, arr.shape)
+    return blocks, descs
+
+
+def _attach(descs):
+    blocks, arrays = [], {}
+    for name, (shm_name, dtype, shape) in descs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype, buffer=shm.buf)
+    return blocks, arrays
+
+
+def _release(blocks, unlink=False):
+    for shm in blocks:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def _run_shared(kernel, descs, params):
+    """Worker side: run a kernel on shared inputs, return shared outputs."""
+    started = time.time()
+    blocks, arrays = _attach(descs)
+    try:
+        (outputs, meta), peak = _measure(TRACE_WORKERS, KERNELS[kernel], arrays, **params)
+        if peak is None:
+            peak = estimate_peak(arrays, outputs, meta.get("n"))
+        del arrays
+    finally:
+        _release(blocks)
+    compute = time.time() - started
+    # The parent copies the outputs out and unlinks these
+    out_blocks, out_descs = _share(outputs)
+    _release(out_blocks)
+    return out_descs, meta, started, compute, peak
+
+
+class DspPool:
+    """run(kernel, arrays, **params) -> (arrays, meta, timing) on either backend.
+
+    timing is {"queue": seconds waiting for a worker, "compute": seconds,
+    "peakBytes": bytes allocated by the kernel at its peak, or estimate_peak
+    when it is not traced}.
+    """
+
+    def __init__(self, backend="thread", workers=None):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown DSP backend: {backend}")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: workers must not inherit torch / uvicorn state from a fork
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+        return self._executor
+
+    def run(self, kernel, arrays, **params):
+        if self.backend == "thread":
+            start = time.perf_counter()
+            (outputs, meta), peak = measure(KERNELS[kernel], arrays, **params)
+            compute = time.perf_counter() - start
+            if peak is None:
+                peak = estimate_peak(arrays, outputs, meta.get("n"))
+            return outputs, meta, {"queue": 0.0, "compute": compute, "peakBytes": peak}
+
+        submitted = time.time()
+        blocks, descs = _share(arrays)
+        try:
+            out_descs, meta, started, compute, peak = (
+                self._pool().submit(_run_shared, kernel, descs, params).result()
+            )
+        finally:
+            _release(blocks, unlink=True)
+        out_blocks, shared = _attach(out_descs)
+        try:
+            outputs = {name: arr.copy() for name, arr in shared.items()}
+            del shared
+        finally:
+            _release(out_blocks, unlink=True)
+        return outputs, meta, {
+            "queue": max(started - submitted, 0.0), "compute": compute, "peakBytes": peak,
+        }
+
+    def warm_up(self):
+        """Start the worker processes now rather than on the first request."""
+        if self.backend == "process":
+            pool = self._pool()
+            for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
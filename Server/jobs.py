@@ -0,0 +1,130 @@
+# server/jobs.py
+# Background jobs for long-running work (model inference), run on a bounded
+# thread pool so the event loop keeps serving the DSP endpoints.
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(RuntimeError):
+    """Raised when the number of unfinished jobs has reached the limit."""
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.state = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+
+    def set_progress(self, fraction):
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+
+    @property
+    def done(self):
+        return self.state in ("done", "error", "cancelled")
+
+    def status(self):
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "progress": round(self.progress, 4),
+            "error": self.error,
+            "queuedSeconds": round((self.started or time.time()) - self.created, 3),
+            "runSeconds": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+
+
+class JobQueue:
+    """Runs fn(job) on a thread pool; at most max_pending jobs may be unfinished."""
+
+    def __init__(self, max_workers=2, max_pending=16, keep_finished=64, keep_seconds=600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.keep_seconds = keep_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn):
+        job = Job(kind)
+        with self._lock:
+            self._prune()
+            pending = sum(1 for j in self._jobs.values() if not j.done)
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs are already queued or running")
+            self._jobs[job.id] = job
+            # The job runs in the submitting request's context (metrics spans)
+            context = contextvars.copy_context()
+            job.future = self._executor.submit(context.run, self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started; returns False once it is running."""
+        job = self.get(job_id)
+        if job is None or not job.future.cancel():
+            return False
+        job.state = "cancelled"
+        job.finished = time.time()
+        return True
+
+    def discard(self, job_id):
+        """Forget a finished job and its result."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.result = None
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "maxPending": self.max_pending,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "finished": sum(1 for s in states if s in ("done", "error", "cancelled")),
+        }
+
+    def _run(self, job, fn):
+        job.state = "running"
+        job.started = time.time()
+        try:
+            job.result = fn(job)
+            job.progress = 1.0
+            job.state = "done"
+        except Exception as e:
+            job.exception = e
+            job.error = str(getattr(e, "detail", e))
+            job.state = "error"
+        finally:
+            job.finished = time.time()
+        if job.exception is not None:
+            raise job.exception
+        return job.result
+
+    def _prune(self):
+        # Drop the oldest finished jobs (and their results) past the limits
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        excess = len(finished) - self.keep_finished
+        for job in finished:
+            if excess > 0 or now - job.finished > self.keep_seconds:
+                del self._jobs[job.id]
+                excess -= 1
@@ -0,0 +1,94 @@
+# server/lod.py
+# Level-of-detail helpers: shrink spectra / spectrograms to what a viewer
+# can actually draw while keeping peaks visible.
+import numpy as np
+
+
+def crop(x, values, x_range=None):
+    """Slice x (sorted) and values (along axis 0) to the [xmin, xmax] viewport."""
+    if x_range is None:
+        return x, values
+    xmin, xmax = x_range
+    lo = 0 if xmin is None else np.searchsorted(x, xmin, side="left")
+    hi = len(x) if xmax is None else np.searchsorted(x, xmax, side="right")
+    return x[lo:hi], values[lo:hi]
+
+
+def bucket_starts(x, n_points, log_x=False):
+    """Start index of each bucket, evenly spaced on a linear or log axis."""
+    if log_x:
+        edges = np.geomspace(x[0], x[-1], n_points + 1)[:-1]
+        starts = np.searchsorted(x, edges, side="left")
+    else:
+        starts = np.linspace(0, len(x), n_points, endpoint=False).astype(np.intp)
+    return np.unique(starts)
+
+
+def decimate(x, values, n_points, x_range=None, log_x=False, mode="peak"):
+    """Reduce values (along axis 0) to about n_points buckets over the viewport.
+
+    mode="peak" keeps each bucket's maximum; mode="minmax" keeps both the
+    minimum and maximum (two points per bucket) so envelopes survive.
+    """
+    x, values = crop(np.asarray(x), np.asarray(values), x_range)
+    if log_x:
+        positive = np.searchsorted(x, 0, side="right")
+        x, values = x[positive:], values[positive:]
+    if not n_points or len(x) <= n_points:
+        return x, values
+
+    starts = bucket_starts(x, n_points, log_x)
+    stops = np.append(starts[1:], len(x))
+    centers = (x[starts] + x[stops - 1]) / 2
+    if mode == "minmax":
+        mins = np.minimum.reduceat(values, starts, axis=0)
+        maxs = np.maximum.reduceat(values, starts, axis=0)
+        return np.repeat(centers, 2), np.stack([mins, maxs], axis=1).reshape(-1, *values.shape[1:])
+    return centers, np.maximum.reduceat(values, starts, axis=0)
+
+
+class MaxPyramid:
+    """Multi-resolution max pyramid along axis 0 of a uniformly spaced grid.
+
+    Level k holds the pairwise maximum of level k-1, so a zoomed-out view can
+    start from a coarse level instead of scanning every bin again.
+    """
+
+    def __init__(self, x, values, min_size=256):
+        x = np.asarray(x)
+        values = np.asarray(values)
+        self.spacing = float(x[1] - x[0]) if len(x) > 1 else 0.0
+        self.levels = [(x, values)]
+        while len(x) >= 2 * min_size:
+            m = len(x) // 2 * 2
+            pairs = np.maximum(values[0:m:2], values[1:m:2])
+            if m < len(x):
+                x = np.concatenate([x[0:m:2], x[-1:]])
+                values = np.concatenate([pairs, values[-1:]])
+            else:
+                x, values = x[0:m:2], pairs
+            self.levels.append((x, values))
+
+    @property
+    def nbytes(self):
+        return sum(x.nbytes + v.nbytes for x, v in self.levels)
+
+    def view(self, n_points, x_range=None, log_x=False):
+        x, values = self.levels[0]
+        if not n_points or self.spacing <= 0:
+            return decimate(x, values, n_points, x_range, log_x)
+
+        # Narrowest bucket width the requested view needs
+        lo = x[0] if x_range is None or x_range[0] is None else x_range[0]
+        hi = x[-1] if x_range is None or x_range[1] is None else x_range[1]
+        if log_x:
+            lo = max(lo, self.spacing)
+            width = lo * ((hi / lo) ** (1 / n_points) - 1) if hi > lo else 0.0
+        else:
+            width = (hi - lo) / n_points
+
+        level = 0
+        if width > self.spacing:
+            level = min(int(np.log2(width / self.spacing)), len(self.levels) - 1)
+        x, values = self.levels[level]
+        return decimate(x, values, n_points, x_range, log_x)
@@ -0,0 +1,345 @@
+# server/metrics.py
+# Per-request timing: a middleware measures every request (latency, bytes in
+# and out), endpoints mark their stages with span("parse") etc., and /metrics
+# renders it all as Prometheus text. Stage durations also go back to the
+# client in a Server-Timing header.
+#
+# Spans find their request through a context variable, so they work in the
+# threadpool running sync endpoints and in job threads (jobs.py copies the
+# submitting request's context).
+#
+# Profiling is opt-in (HARMONIX_PROFILING=1): a request carrying
+# `?profile=cprofile` or `?profile=torch` (or an X-Profile header) runs the
+# functions decorated with @profiled under that profiler. The response's
+# X-Profile-Id names the result, served by GET /profiles/{id}: cProfile stats
+# as text, or a torch profiler Chrome trace (chrome://tracing, Perfetto).
+import bisect
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from starlette.routing import Match
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILING = os.environ.get("HARMONIX_PROFILING", "0").lower() in ("1", "true", "yes")
+PROFILERS = ("cprofile", "torch")
+
+SECONDS_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+
+
+# ---------- metric types ----------
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{k}="{str(v)}"' for k, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[k] for k in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.label_names, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[k] for k in self.label_names)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        names = self.label_names + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}"
+
+
+class Gauge:
+    """A gauge read from fn() at scrape time."""
+
+    def __init__(self, name, help, fn):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self):
+        value = self.fn()
+        if value is None:
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {value}"
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+REQUEST_SECONDS = Histogram(
+    "harmonix_request_seconds", "Request latency, first byte in to last byte out.",
+    ("route", "method", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "harmonix_stage_seconds", "Time spent in each named stage of a request.", ("route", "stage"),
+)
+REQUEST_BYTES = Counter("harmonix_request_bytes_total", "Request body bytes received.", ("route",))
+RESPONSE_BYTES = Counter("harmonix_response_bytes_total", "Response body bytes sent.", ("route",))
+PEAK_BYTES = Histogram(
+    "harmonix_dsp_peak_bytes", "Peak memory allocated by a DSP kernel.", ("route",),
+    buckets=BYTES_BUCKETS,
+)
+MAX_RSS = Gauge("harmonix_process_max_rss_bytes", "Peak resident set size of the server process.", _max_rss)
+
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, REQUEST_BYTES, RESPONSE_BYTES, PEAK_BYTES, MAX_RSS]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+# ---------- per-request spans ----------
+class RequestRecord:
+    def __init__(self, route, profiler=None):
+        self.route = route
+        self.spans = []  # (stage, seconds) in completion order
+        self.profiler = profiler
+        self.profile_id = uuid.uuid4().hex if profiler else None
+        self.profiling = False
+
+
+_current = contextvars.ContextVar("harmonix_request", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def record_stage(stage, seconds):
+    record = _current.get()
+    route = record.route if record is not None else "none"
+    STAGE_SECONDS.observe(seconds, route=route, stage=stage)
+    if record is not None:
+        record.spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_dsp(timing):
+    """Stages and peak memory from a DspPool timing dict."""
+    record_stage("dsp_queue", timing["queue"])
+    record_stage("dsp_compute", timing["compute"])
+    if timing.get("peakBytes") is not None:
+        record = _current.get()
+        PEAK_BYTES.observe(timing["peakBytes"], route=record.route if record else "none")
+
+
+def server_timing(record, total):
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in record.spans]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+# ---------- profiling ----------
+class ProfileStore:
+    """The most recent profiles by id: (media type, content)."""
+
+    def __init__(self, keep=16):
+        self.keep = keep
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, profile_id, media_type, content):
+        with self._lock:
+            self._items[profile_id] = (media_type, content)
+            while len(self._items) > self.keep:
+                self._items.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._items.get(profile_id)
+
+
+profiles = ProfileStore(int(os.environ.get("HARMONIX_PROFILE_KEEP", "16")))
+
+
+@contextmanager
+def _cprofile(profile_id):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+        profiles.put(profile_id, "text/plain", out.getvalue())
+
+
+@contextmanager
+def _torch_profile(profile_id):
+    from torch.profiler import ProfilerActivity, profile
+
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+        yield
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        prof.export_chrome_trace(path)
+        with open(path) as f:
+            profiles.put(profile_id, "application/json", f.read())
+    finally:
+        os.remove(path)
+
+
+def profiled(fn):
+    """Run fn under the profiler its request asked for (outermost call only)."""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        record = _current.get()
+        if record is None or record.profiler is None or record.profiling:
+            return fn(*args, **kwargs)
+        profile = _cprofile if record.profiler == "cprofile" else _torch_profile
+        record.profiling = True
+        try:
+            with profile(record.profile_id):
+                return fn(*args, **kwargs)
+        finally:
+            record.profiling = False
+    return run
+
+
+# ---------- middleware ----------
+def route_of(app, scope):
+    """The matching route's path template, so /jobs/{job_id} is one series."""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def requested_profiler(scope):
+    if not PROFILING:
+        return None
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            value = value.decode().lower()
+            return value if value in PROFILERS else None
+    query = scope.get("query_string", b"").decode()
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        if key == "profile" and value.lower() in PROFILERS:
+            return value.lower()
+    return None
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (streaming responses pass straight through)."""
+
+    def __init__(self, app, router_app=None):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        record = RequestRecord(route_of(self.router_app, scope), requested_profiler(scope))
+        token = _current.set(record)
+        start = time.perf_counter()
+        status = 500
+        received = sent = 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                timing = server_timing(record, time.perf_counter() - start)
+                headers.append((b"server-timing", timing.encode()))
+                if record.profile_id:
+                    headers.append((b"x-profile-id", record.profile_id.encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            _current.reset(token)
+            route = record.route
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, route=route, method=scope["method"], status=status,
+            )
+            REQUEST_BYTES.inc(received, route=route)
+            RESPONSE_BYTES.inc(sent, route=route)
@@ -161,12 +161,15 @@ class MultiDecoderDPRNN(BaseModel):
             selector_output, shape
         )
 
-    def forward_wav(self, wav, slice_size=32000, *args, **kwargs):
+    def forward_wav(self, wav, slice_size=32000, slice_stride=None, *args, **kwargs):
         """Separation method for waveforms.
         Unfolds a full audio into slices, estimate
         Args:
             wav (torch.Tensor): waveform array/tensor.
                 Shape: 1D, 2D or 3D tensor, time last.
+            slice_size (int): length of each slice in samples.
+            slice_stride (int or None): hop between slices.
+                Defaults to `slice_size // 2` (50% overlap).
         Return:
             output_cat (torch.Tensor): concatenated output tensor.
                 [num_spks, T]
@@ -176,14 +179,15 @@ class MultiDecoderDPRNN(BaseModel):
         if wav.ndim == 1:
             wav = wav.reshape(1, wav.size(0))
         assert wav.ndim == 2  # [1, T]
-        slice_stride = slice_size // 2
-        # pad wav to integer multiple of slice_stride
-        T_padded = max(int(np.ceil(T / slice_stride)), 2) * slice_stride
+        slice_stride = slice_stride or slice_size // 2
+        assert 0 < slice_stride <= slice_size
+        # pad wav so that the slices exactly cover it
+        slice_nb = max(int(np.ceil((T - slice_size) / slice_stride)), 0) + 1
+        T_padded = (slice_nb - 1) * slice_stride + slice_size
         wav = F.pad(wav, (0, T_padded - T))
         slices = wav.unfold(
             dimension=-1, size=slice_size, step=slice_stride
         )  # [1, slice_nb, slice_size]
-        slice_nb = slices.size(1)
         slices = slices.squeeze(0).unsqueeze(1)
         tf_rep = self.enc_activation(self.encoder(slices))
         est_masks_list = self.masker(tf_rep)
@@ -192,24 +196,41 @@ class MultiDecoderDPRNN(BaseModel):
             slice_nb, -1
         )  # [slice_nb, num_decs]
         est_idx, _ = selector_output.argmax(-1).mode()
+        est_idx = int(est_idx)
         est_spks = self.decoder_select.n_srcs[est_idx]
-        output_wavs, _ = self.decoder_select(
-            est_masks_list, tf_rep, ground_truth=[est_spks] * slice_nb
-        )  # [slice_nb, 1, n_spks, slice_size]
-        output_wavs = output_wavs.squeeze(1)[:, :est_spks, :]
-        # TODO: overlap and add (with division)
-        output_cat = output_wavs.new_zeros(est_spks, slice_nb * slice_size)
-        output_cat[:, :slice_size] = output_wavs[0]
-        start = slice_stride
-        for i in range(1, slice_nb):
-            overlap_prev = output_cat[:, start : start + slice_stride].unsqueeze(0)
-            overlap_next = output_wavs[i : i + 1, :, :slice_stride]
+        # Only the chosen decoder runs, directly on the selector's input
+        output_wavs = self.decoder_select.decode(
+            selector_input, tf_rep, est_idx
+        )  # [slice_nb, n_spks, slice_size]
+
+        overlap = slice_size - slice_stride
+        if slice_nb > 1 and overlap > 0:
+            # Best permutation of every slice w.r.t. its predecessor, in one batch
+            overlap_prev = output_wavs[:-1, :, slice_stride:]
+            overlap_next = output_wavs[1:, :, :overlap]
             pw_losses = pairwise_neg_sisdr(overlap_next, overlap_prev)
-            _, best_indices = PITLossWrapper.find_best_perm(pw_losses)
-            reordered = PITLossWrapper.reorder_source(output_wavs[i : i + 1, :, :], best_indices)
-            output_cat[:, start : start + slice_size] += reordered.squeeze(0)
-            output_cat[:, start : start + slice_stride] /= 2
-            start += slice_stride
+            _, rel_perms = PITLossWrapper.find_best_perm(pw_losses)  # [slice_nb - 1, n_spks]
+            # Compose them so every slice is aligned with the first one
+            perms = [torch.arange(est_spks, device=output_wavs.device)]
+            for rel in rel_perms:
+                perms.append(rel[perms[-1]])
+            perms = torch.stack(perms)  # [slice_nb, n_spks]
+            output_wavs = torch.gather(
+                output_wavs, 1, perms.unsqueeze(-1).expand_as(output_wavs)
+            )
+
+        # Overlap and add all slices at once, dividing by the overlap count
+        frames = output_wavs.permute(1, 2, 0)  # [n_spks, slice_size, slice_nb]
+        output_cat = fold(
+            frames, (T_padded, 1), kernel_size=(slice_size, 1), stride=(slice_stride, 1)
+        ).reshape(est_spks, T_padded)
+        norm = fold(
+            output_wavs.new_ones(1, slice_size, slice_nb),
+            (T_padded, 1),
+            kernel_size=(slice_size, 1),
+            stride=(slice_stride, 1),
+        ).reshape(1, T_padded)
+        output_cat = output_cat / norm.clamp_min(1e-8)
         return output_cat[:, :T]
 
 
@@ -438,21 +459,46 @@ class Decoder_Select(nn.Module):
         )
         selector_output = self.selector(output).reshape(batch, num_stages, -1)
         output = output.reshape(batch, num_stages, bn_chan, chunk_size, n_chunks)
-        # [batch, num_stages, in_chan, n_frames]
-        mixture_w = mixture_w.unsqueeze(1).repeat(1, num_stages, 1, 1)
         if ground_truth is not None:  # oracle
             decoder_selected = torch.LongTensor([self.n_src2idx[truth] for truth in ground_truth])
         else:
             assert num_stages == 1  # can't use select with multistage
             decoder_selected = selector_output.reshape(batch, -1).argmax(1)
         T = self.kernel_size + self.stride * (n_frames - 1)
-        output_wavs = torch.zeros(batch, num_stages, max(self.n_srcs), T).to(output.device)
-        for i in range(batch):
-            output_wavs[i, :, : self.n_srcs[decoder_selected[i]], :] = self.decoders[
-                decoder_selected[i]
-            ](output[i], mixture_w[i])
+        output_wavs = output.new_zeros(batch, num_stages, max(self.n_srcs), T)
+        # Run each decoder once, on every example that selected it
+        for idx, items in self.group_by_decoder(decoder_selected):
+            n_src = self.n_srcs[idx]
+            group_out = output[items].reshape(-1, bn_chan, chunk_size, n_chunks)
+            # [group * num_stages, in_chan, n_frames]; a view when num_stages == 1
+            group_mix = (
+                mixture_w[items]
+                .unsqueeze(1)
+                .expand(-1, num_stages, -1, -1)
+                .reshape(-1, in_chan, n_frames)
+            )
+            est_wavs = self.decoders[idx](group_out, group_mix)
+            output_wavs[items, :, :n_src, :] = est_wavs.reshape(len(items), num_stages, n_src, T)
         return output_wavs, selector_output
 
+    @staticmethod
+    def group_by_decoder(decoder_selected):
+        """Yield (decoder index, batch indices that selected it)."""
+        decoder_selected = torch.as_tensor(decoder_selected)
+        for idx in decoder_selected.unique().tolist():
+            yield idx, (decoder_selected == idx).nonzero(as_tuple=True)[0]
+
+    def decode(self, output, mixture_w, decoder_idx):
+        """Run a single decoder on the whole batch, skipping selection and padding.
+        Args:
+            output: last stage output, $(batch, bn_chan, chunk_size, n_chunks)$
+            mixture_w: $(batch, in_chan, n_frames)$
+            decoder_idx: int, index into `self.decoders`
+        Output:
+            est_wavs: $(batch, n_srcs[decoder_idx], T)$
+        """
+        return self.decoders[decoder_idx](output, mixture_w)
+
 
 def load_best_model(train_conf, exp_dir, sample_rate):
     """Load best model after training.
@@ -0,0 +1,102 @@
+# server/model_registry.py
+# Keeps each separation model loaded once and shared between requests.
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ModelBusy(RuntimeError):
+    """Raised when no inference slot frees up within the timeout."""
+
+
+def model_nbytes(model):
+    """Bytes held by a torch module's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelSlot:
+    """One named model: loaded at most once, used by at most N requests at a time."""
+
+    def __init__(self, name, loader, max_concurrency=1):
+        self.name = name
+        self.loader = loader
+        self.max_concurrency = max_concurrency
+        self.model = None
+        self.state = "unloaded"
+        self.error = None
+        self.load_seconds = None
+        self.nbytes = 0
+        self.active = 0
+        self._load_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def load(self):
+        if self.model is not None:
+            return self.model
+        # Concurrent first requests wait here instead of loading their own copy
+        with self._load_lock:
+            if self.model is not None:
+                return self.model
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                model = self.loader()
+                self.nbytes = model_nbytes(model)
+            except Exception as e:
+                self.state = "error"
+                self.error = str(e)
+                raise
+            self.load_seconds = time.perf_counter() - start
+            self.error = None
+            self.model = model
+            self.state = "ready"
+            return model
+
+    @contextmanager
+    def use(self, timeout=None):
+        model = self.load()
+        if not self._slots.acquire(timeout=timeout):
+            raise ModelBusy(f"{self.name} is busy ({self.max_concurrency} requests in flight)")
+        with self._count_lock:
+            self.active += 1
+        try:
+            yield model
+        finally:
+            with self._count_lock:
+                self.active -= 1
+            self._slots.release()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "loadSeconds": self.load_seconds,
+            "bytes": self.nbytes,
+            "active": self.active,
+            "maxConcurrency": self.max_concurrency,
+        }
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._slots = {}
+
+    def register(self, name, loader, max_concurrency=1):
+        self._slots[name] = ModelSlot(name, loader, max_concurrency)
+
+    def __contains__(self, name):
+        return name in self._slots
+
+    def __getitem__(self, name):
+        return self._slots[name]
+
+    def load(self, name):
+        return self._slots[name].load()
+
+    def use(self, name, timeout=None):
+        return self._slots[name].use(timeout=timeout)
+
+    def status(self):
+        return {name: slot.status() for name, slot in self._slots.items()}
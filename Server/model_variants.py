@@ -0,0 +1,172 @@
+# server/model_variants.py
+# Faster inference variants of the separation models.
+#
+#   float     the eager float32 model as loaded
+#   int8      dynamic int8 quantization of LSTM/GRU/Linear layers (CPU only)
+#   compiled  torch.compile on the compute-heavy submodules
+#
+# Variants are built from the float model, which stays untouched.
+#
+# Run as a script to check a variant's quality and speed against the float
+# model on the bundled samples:
+#
+#   python model_variants.py --model MultiDecoderDPRNN --variants int8 compiled
+import argparse
+import copy
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+VARIANTS = ("float", "int8", "compiled")
+SAMPLES_GLOB = os.path.join(os.path.dirname(__file__), "..", "Client", "public", "*.wav")
+
+
+def variant_name(name, variant):
+    """Registry name of a model variant ("htdemucs_6s:int8"); float is the bare name."""
+    return name if variant == "float" else f"{name}:{variant}"
+
+
+def make_variant(model, variant):
+    if variant == "float":
+        return model
+    if variant == "int8":
+        return quantize(model)
+    if variant == "compiled":
+        return compile_model(model)
+    raise ValueError(f"Unknown model variant: {variant}")
+
+
+def quantize(model):
+    import torch
+    from torch.ao.nn.quantized.dynamic import LSTM as QuantizedLSTM
+    from torch.ao.quantization import quantize_dynamic
+
+    # Quantized kernels are CPU only
+    model = copy.deepcopy(model).cpu().eval()
+    model = quantize_dynamic(model, {torch.nn.LSTM, torch.nn.GRU, torch.nn.Linear}, dtype=torch.qint8)
+    for module in model.modules():
+        # asteroid's SingleRNN calls rnn.flatten_parameters() on every forward
+        if isinstance(module, QuantizedLSTM) and not hasattr(module, "flatten_parameters"):
+            module.flatten_parameters = lambda: None
+    return model
+
+
+def compile_targets(model):
+    """Submodules worth compiling; the top-level entry points are not plain forwards."""
+    if hasattr(model, "masker"):  # MultiDecoderDPRNN: forward_wav drives these
+        return [model.encoder, model.masker, *model.decoder_select.decoders]
+    if hasattr(model, "models"):  # demucs BagOfModels
+        return list(model.models)
+    return [model]
+
+
+def compile_model(model):
+    model = copy.deepcopy(model).eval()
+    for module in compile_targets(model):
+        # In place, so isinstance checks and attributes (sources, samplerate) still work
+        module.compile(dynamic=True)
+    return model
+
+
+# ---------- quality check ----------
+def si_sdr(estimate, reference, eps=1e-8):
+    """Scale-invariant SDR in dB along the last axis."""
+    estimate = estimate - estimate.mean(axis=-1, keepdims=True)
+    reference = reference - reference.mean(axis=-1, keepdims=True)
+    scale = (estimate * reference).sum(-1, keepdims=True) / ((reference ** 2).sum(-1, keepdims=True) + eps)
+    target = scale * reference
+    noise = estimate - target
+    return 10 * np.log10(((target ** 2).sum(-1) + eps) / ((noise ** 2).sum(-1) + eps))
+
+
+def matched_si_sdr(estimates, references):
+    """Mean SI-SDR per source, pairing each reference with its best estimate."""
+    estimates = estimates.reshape(estimates.shape[0], -1)
+    references = references.reshape(references.shape[0], -1)
+    scores = [max(si_sdr(est, ref) for est in estimates) for ref in references]
+    return float(np.mean(scores))
+
+
+def separator(model):
+    """fn(audio [channels, time] float32, fs) -> stems [n, ..., time] for either model."""
+    import torch
+
+    if hasattr(model, "forward_wav"):
+        def run(audio, fs):
+            mono = torch.from_numpy(audio.mean(axis=0))
+            device = next(model.parameters()).device
+            with torch.no_grad():
+                return model.forward_wav(mono.to(device)).cpu().numpy()
+        return run
+
+    from separation import separate_demucs
+
+    def run(audio, fs):
+        return separate_demucs(model, audio, fs)
+    return run
+
+
+def read_sample(path, seconds):
+    import soundfile as sf
+
+    audio, fs = sf.read(path, dtype="float32", always_2d=True)
+    if seconds:
+        audio = audio[: int(seconds * fs)]
+    return np.ascontiguousarray(audio.T), fs
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def check(float_model, variants, paths, seconds=None, warmup=True):
+    """Yield one report per (sample, variant) comparing against the float model."""
+    reference = separator(float_model)
+    built = {v: make_variant(float_model, v) for v in variants}
+    runners = {v: separator(m) for v, m in built.items()}
+    for path in paths:
+        audio, fs = read_sample(path, seconds)
+        base, base_seconds = timed(reference, audio, fs)
+        for variant, run in runners.items():
+            if warmup:
+                run(audio, fs)  # compiled variants pay their compile here
+            out, run_seconds = timed(run, audio, fs)
+            yield {
+                "sample": os.path.basename(path),
+                "variant": variant,
+                "siSdr": round(matched_si_sdr(out, base), 2),
+                "floatSeconds": round(base_seconds, 3),
+                "seconds": round(run_seconds, 3),
+                "speedup": round(base_seconds / run_seconds, 2) if run_seconds else None,
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare model variants against the float model (SI-SDR and speed)."
+    )
+    parser.add_argument("--model", default="MultiDecoderDPRNN",
+                        help="registry name: MultiDecoderDPRNN or htdemucs_6s")
+    parser.add_argument("--variants", nargs="+", default=["int8", "compiled"], choices=VARIANTS[1:])
+    parser.add_argument("--samples", nargs="*", help="wav files (default: Client/public/*.wav)")
+    parser.add_argument("--seconds", type=float, default=None, help="only use the first N seconds")
+    parser.add_argument("--no-warmup", action="store_true")
+    args = parser.parse_args(argv)
+
+    # Reuse the server's loaders (and HARMONIX_MODEL_DIR) for the float model
+    from ServerPy import models
+
+    float_model = models.load(args.model)
+    paths = args.samples or sorted(glob.glob(SAMPLES_GLOB))
+    for report in check(float_model, args.variants, paths,
+                        seconds=args.seconds, warmup=not args.no_warmup):
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# server/separation.py
+# Segmented source separation: run the model on fixed-size pieces of the
+# track and stitch them with a linear crossfade, so working memory depends
+# on the segment length rather than the track length.
+import numpy as np
+
+
+def segment_bounds(total, segment, overlap):
+    """(start, stop) of each segment; consecutive segments share `overlap` samples."""
+    step = segment - overlap
+    start = 0
+    while True:
+        stop = min(start + segment, total)
+        yield start, stop
+        if stop >= total:
+            return
+        start += step
+
+
+def crossfade_segments(pieces, overlap):
+    """Stitch overlapping model outputs into final, non-overlapping blocks.
+
+    pieces yields arrays shaped [..., time] for the bounds from segment_bounds.
+    Yields (start, block) where each block is final and blocks tile the track.
+    """
+    fade_in = np.linspace(0.0, 1.0, overlap + 2, dtype=np.float32)[1:-1]
+    fade_out = 1.0 - fade_in
+    carry = None
+    position = 0
+    for piece in pieces:
+        if carry is not None:
+            head = piece[..., :overlap] * fade_in + carry * fade_out
+            piece = np.concatenate([head, piece[..., overlap:]], axis=-1)
+        carry = piece[..., -overlap:] if overlap else None
+        block = piece[..., : piece.shape[-1] - overlap] if overlap else piece
+        yield position, block
+        position += block.shape[-1]
+    if carry is not None:
+        yield position, carry
+
+
+def demucs_segments(model, audio, fs, segment_seconds=30.0, overlap_seconds=1.0):
+    """Separate audio ([channels, time] float32) segment by segment.
+
+    Yields (start, stems) with stems shaped [n_sources, channels, length],
+    in time order, as soon as each block is final. segment_seconds must be
+    positive and overlap_seconds non-negative.
+    """
+    if segment_seconds <= 0 or overlap_seconds < 0:
+        raise ValueError("segment must be > 0 and overlap >= 0 seconds")
+    import torch
+    from demucs.apply import apply_model
+
+    total = audio.shape[-1]
+    segment = max(int(segment_seconds * fs), 1)
+    overlap = min(max(int(overlap_seconds * fs), 0), segment // 2)
+
+    def pieces():
+        for start, stop in segment_bounds(total, segment, overlap):
+            chunk = torch.from_numpy(np.ascontiguousarray(audio[:, start:stop]))
+            with torch.no_grad():
+                out = apply_model(model, chunk.unsqueeze(0), device="cpu")[0]
+            yield out.numpy()
+
+    # The last segment can be shorter than the overlap only if it is the first
+    yield from crossfade_segments(pieces(), overlap if total > segment else 0)
+
+
+def separate_demucs(model, audio, fs, progress=None, **kwargs):
+    """Full [n_sources, channels, time] separation via demucs_segments.
+
+    progress, if given, is called with the fraction of the track done.
+    """
+    total = audio.shape[-1]
+    stems = np.empty((len(model.sources), audio.shape[0], total), dtype=np.float32)
+    for start, block in demucs_segments(model, audio, fs, **kwargs):
+        stop = start + block.shape[-1]
+        stems[..., start:stop] = block
+        if progress:
+            progress(stop / max(total, 1))
+    return stems
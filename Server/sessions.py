@@ -0,0 +1,101 @@
+# server/sessions.py
+# Server-side audio sessions: the client uploads a signal once and then
+# refers to it by handle, so slider moves don't re-send the whole buffer.
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from dsp import padded_rfft, real_dtype, rfft_freqs
+
+
+class AudioSession:
+    """One uploaded signal plus its cached forward spectrum.
+
+    precision="float32" stores float32 samples and a complex64 spectrum,
+    half the memory of the float64 default. sizing picks the padded FFT
+    length (see dsp.fft_size).
+    """
+
+    def __init__(self, samples, fs, precision="float64", sizing="pow2"):
+        self.samples = np.asarray(samples, dtype=real_dtype(precision))
+        self.fs = float(fs)
+        self.precision = precision
+        self.n_original = len(self.samples)
+
+        # Zero-padded forward rfft and its frequency grid, computed once
+        self.spectrum, self.n = padded_rfft(self.samples, sizing)
+        self.freqs = rfft_freqs(self.n, self.fs)
+
+        # Views derived from the signal (pyramids, spectrograms, ...) by key
+        self.derived = {}
+
+    @property
+    def nbytes(self):
+        derived = sum(getattr(v, "nbytes", 0) for v in self.derived.values())
+        return self.samples.nbytes + self.spectrum.nbytes + self.freqs.nbytes + derived
+
+
+class SessionStore:
+    """Size-bounded LRU of AudioSession objects keyed by an opaque id."""
+
+    def __init__(self, max_bytes, max_sessions=64):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def create(self, samples, fs, precision="float64", sizing="pow2"):
+        session = AudioSession(samples, fs, precision, sizing)
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = session
+            self._bytes += session.nbytes
+            self._evict()
+        return session_id, session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def derived(self, session_id, session, key, factory):
+        """Return session.derived[key], building it with factory() on first use."""
+        value = session.derived.get(key)
+        if value is not None:
+            return value
+        value = factory()
+        with self._lock:
+            before = session.nbytes
+            session.derived[key] = value
+            if self._sessions.get(session_id) is session:
+                self._bytes += session.nbytes - before
+                self._evict()
+        return value
+
+    def delete(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._bytes -= session.nbytes
+            return session is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+            }
+
+    def _evict(self):
+        # Drop least recently used sessions, but never the one just added
+        while len(self._sessions) > 1 and (
+            self._bytes > self.max_bytes or len(self._sessions) > self.max_sessions
+        ):
+            _, old = self._sessions.popitem(last=False)
+            self._bytes -= old.nbytes
@@ -0,0 +1,166 @@
+# server/stem_cache.py
+# Cache of separated stems keyed by the uploaded audio's content hash and the
+# model that produced them, so changing a gain slider is just a re-mix.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class StemCache:
+    """Two-tier (memory LRU + .npy files on disk) store of stem arrays.
+
+    Disk entries are memory-mapped when read back, so a warm disk tier costs
+    page cache rather than process memory.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None, disk_max_bytes=None, dtype="float32",
+                 max_entries=128):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.dtype = np.dtype(dtype)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(audio_hash, model_id, **params):
+        extra = ",".join(f"{k}={params[k]}" for k in sorted(params))
+        suffix = hashlib.sha256(extra.encode()).hexdigest()[:12] if extra else "default"
+        return f"{model_id}-{audio_hash[:40]}-{suffix}"
+
+    def get(self, key):
+        """Return (stems, meta) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits["memory"] += 1
+                return entry[:2]
+        entry = self._load(key)
+        if entry is not None:
+            self._remember(key, entry)
+            with self._lock:
+                self.hits["disk"] += 1
+        return entry
+
+    def put(self, key, stems, meta, dtype=None):
+        """Store stems as the cache dtype, or as dtype (e.g. complex spectra)."""
+        stems = np.ascontiguousarray(stems, dtype=dtype or self.dtype)
+        entry = (stems, dict(meta))
+        self._remember(key, entry)
+        self._store(key, entry)
+        return entry
+
+    def get_or_compute(self, key, compute, dtype=None):
+        """Cached (stems, meta); concurrent misses for one key compute it once."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self.get(key)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                stems, meta = compute()
+                entry = self.put(key, stems, meta, dtype)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "dir": self.cache_dir,
+            }
+
+    # ---------- memory tier ----------
+    def _remember(self, key, entry):
+        # Memory-mapped disk entries live in the page cache, not our budget
+        nbytes = 0 if isinstance(entry[0], np.memmap) else entry[0].nbytes
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (entry[0], entry[1], nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > 1 and (
+                self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+
+    # ---------- disk tier ----------
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".npy", base + ".json"
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        npy_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            stems = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        os.utime(npy_path)  # keep recently used entries when pruning
+        return stems, meta
+
+    def _store(self, key, entry):
+        if not self.cache_dir:
+            return
+        stems, meta = entry
+        npy_path, meta_path = self._paths(key)
+        try:
+            # Write to temp names first so readers never see partial files
+            np.save(npy_path + ".tmp.npy", stems)
+            os.replace(npy_path + ".tmp.npy", npy_path)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            print(f"Failed to write stem cache entry {key}: {e}")
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        if not self.disk_max_bytes:
+            return
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy") and ".tmp" not in name:
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            for stale in (path, path[: -len(".npy")] + ".json"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
@@ -0,0 +1,49 @@
+# server/test_validation.py
+# Bad request fields must come back as 422, not as a 500 from deep inside
+# the DSP code. Run from Server/ with: python -m pytest -q
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import ServerPy
+
+client = TestClient(ServerPy.app)
+FS = 8000.0
+
+
+def signal(n=4096):
+    t = np.arange(n) / FS
+    return np.sin(2 * np.pi * 440 * t).tolist()
+
+
+@pytest.fixture(scope="module")
+def session_id():
+    response = client.post("/session", json={"samples": signal(), "fs": FS})
+    assert response.status_code == 200
+    return response.json()["sessionId"]
+
+
+@pytest.mark.parametrize("value", [0, -5])
+@pytest.mark.parametrize("endpoint, field", [
+    ("/calculatefft", "points"),
+    ("/applyEqualizer", "points"),
+    ("/spectrogram", "maxFrames"),
+    ("/spectrogram", "maxFreqBins"),
+])
+def test_lod_sizes_must_be_positive(session_id, endpoint, field, value):
+    extra = {"sliders": []} if endpoint == "/applyEqualizer" else {}
+    inline = {"samples": signal(), "fs": FS, field: value, **extra}
+    by_session = {"sessionId": session_id, field: value, **extra}
+    for body in (inline, by_session):
+        assert client.post(endpoint, json=body).status_code == 422
+
+
+@pytest.mark.parametrize("sizing", ["fast", "exact", "pow2"])
+@pytest.mark.parametrize("endpoint", ["/calculatefft", "/applyEqualizer"])
+def test_empty_samples(monkeypatch, sizing, endpoint):
+    # next_fast_len(0) is 0, which rfft rejects; every sizing must still answer
+    monkeypatch.setattr(ServerPy, "FFT_SIZING", sizing)
+    body = {"samples": [], "fs": FS, "sliders": [{"low": 0, "high": 100, "value": 2}]}
+    response = client.post(endpoint, json=body)
+    assert response.status_code == 200
+    assert response.json()["frequencies"] == [0.0]
@@ -0,0 +1,159 @@
+# server/wire.py
+# Binary wire format for sample buffers and spectra.
+#
+# Two media types are understood besides JSON:
+#
+#   application/octet-stream       raw little-endian float32 samples
+#   application/x-harmonix-frames  several named arrays in one body:
+#
+#       b"HXF1" | uint32 LE header length | header (UTF-8 JSON) | pad to 8 | data
+#
+#   where header = {"meta": {...scalars...},
+#                   "arrays": [{"name", "dtype", "shape", "offset", "nbytes"}]}
+#   and each offset is relative to the start of the data section.
+import json
+import struct
+
+import numpy as np
+
+OCTET_STREAM = "application/octet-stream"
+FRAMED = "application/x-harmonix-frames"
+
+MAGIC = b"HXF1"
+ALIGN = 8
+ALLOWED_DTYPES = {"<f4", "<f8", "<i2", "<i4", "<i8"}
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def media_type(content_type):
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def is_binary(content_type):
+    return media_type(content_type) in (OCTET_STREAM, FRAMED)
+
+
+def negotiate(accept, n_arrays):
+    """Pick the response media type from an Accept header, or None for JSON."""
+    accept = (accept or "").lower()
+    if FRAMED in accept:
+        return FRAMED
+    # Raw float32 can only carry a single unnamed array
+    if OCTET_STREAM in accept and n_arrays == 1:
+        return OCTET_STREAM
+    return None
+
+
+def decode(body, content_type):
+    """Return (meta, arrays) for a binary body. Arrays are zero-copy views."""
+    kind = media_type(content_type)
+    if kind == OCTET_STREAM:
+        if len(body) % 4:
+            raise WireFormatError("octet-stream body must be a whole number of float32 samples")
+        return {}, {"samples": np.frombuffer(body, dtype="<f4")}
+    if kind == FRAMED:
+        return _decode_framed(body)
+    raise WireFormatError(f"Unsupported content type: {content_type}")
+
+
+def encode(arrays, meta=None, kind=FRAMED):
+    """Serialize named arrays (sent as float32 unless already integer)."""
+    if kind == OCTET_STREAM:
+        (arr,) = arrays.values()
+        return _as_wire_array(arr).tobytes()
+
+    entries = []
+    chunks = []
+    offset = 0
+    for name, arr in arrays.items():
+        arr = _as_wire_array(arr)
+        entries.append({
+            "name": name,
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "offset": offset,
+            "nbytes": arr.nbytes,
+        })
+        chunks.append(arr.tobytes())
+        pad = -arr.nbytes % ALIGN
+        if pad:
+            chunks.append(b"\0" * pad)
+        offset += arr.nbytes + pad
+
+    header = json.dumps({"meta": meta or {}, "arrays": entries}).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % ALIGN)
+    return b"".join([MAGIC, struct.pack("<I", len(header)), header, *chunks])
+
+
+def _as_wire_array(arr):
+    arr = np.asarray(arr)
+    if arr.dtype.kind in "iu":
+        return np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+    return np.ascontiguousarray(arr, dtype="<f4")
+
+
+def _decode_framed(body):
+    view = memoryview(body)
+    if len(view) < 8 or bytes(view[:4]) != MAGIC:
+        raise WireFormatError("Missing HXF1 magic")
+    (header_len,) = struct.unpack_from("<I", view, 4)
+    data_start = 8 + header_len
+    if data_start > len(view):
+        raise WireFormatError("Truncated header")
+    try:
+        header = json.loads(bytes(view[8:data_start]).decode("utf-8"))
+    except ValueError as e:
+        raise WireFormatError(f"Bad header: {e}")
+    if not isinstance(header, dict) or not isinstance(header.get("arrays", []), list):
+        raise WireFormatError("Bad header: expected {\"meta\": {...}, \"arrays\": [...]}")
+    meta = header.get("meta", {})
+    if not isinstance(meta, dict):
+        raise WireFormatError("Bad header: meta must be an object")
+
+    arrays = {}
+    for entry in header.get("arrays", []):
+        if not isinstance(entry, dict):
+            raise WireFormatError("Bad header: array entries must be objects")
+        name, offset, nbytes = entry.get("name"), entry.get("offset"), entry.get("nbytes")
+        if not isinstance(name, str):
+            raise WireFormatError("Array entry is missing its name")
+        if not isinstance(offset, int) or not isinstance(nbytes, int):
+            raise WireFormatError(f"Array {name!r} needs integer offset and nbytes")
+        dtype = entry.get("dtype", "<f4")
+        if dtype not in ALLOWED_DTYPES:
+            raise WireFormatError(f"Unsupported dtype: {dtype}")
+        start = data_start + offset
+        stop = start + nbytes
+        if start < data_start or stop < start or stop > len(view):
+            raise WireFormatError(f"Array {name!r} is out of bounds")
+        try:
+            arr = np.frombuffer(view[start:stop], dtype=dtype)
+            shape = entry.get("shape")
+            if shape is not None:
+                arr = arr.reshape(shape)
+        except (TypeError, ValueError) as e:
+            raise WireFormatError(f"Array {name!r}: {e}")
+        arrays[name] = arr
+    return meta, arrays
+
+
+def message_size(buffer, offset=0):
+    """Total size of the framed message starting at offset (for streamed bodies)."""
+    (header_len,) = struct.unpack_from("<I", buffer, offset + 4)
+    data_start = offset + 8 + header_len
+    header = json.loads(bytes(buffer[offset + 8 : data_start]).decode("utf-8"))
+    data = max((e["offset"] + e["nbytes"] for e in header.get("arrays", [])), default=0)
+    return 8 + header_len + data + (-data % ALIGN)
+
+
+def iter_decode(body):
+    """Yield (meta, arrays) for each framed message in a back-to-back stream."""
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        size = message_size(view, offset)
+        yield _decode_framed(view[offset : offset + size])
+        offset += size